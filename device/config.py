@@ -59,6 +59,7 @@ class Config:
     # Motor Speed Settings
     DEFAULT_MOTOR_SPEED = int(os.getenv('DEFAULT_MOTOR_SPEED', '70'))
     TURN_MOTOR_SPEED = int(os.getenv('TURN_MOTOR_SPEED', '60'))
+    USE_PIGPIO = os.getenv('USE_PIGPIO', 'True').lower() in ('true', '1', 'yes')  # DMA-timed PWM via pigpiod when available
     
     # Line Following Configuration
     LINE_FOLLOW_SPEED = int(os.getenv('LINE_FOLLOW_SPEED', '40'))
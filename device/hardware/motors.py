@@ -5,6 +5,59 @@ Manages DC motors for robot movement
 import RPi.GPIO as GPIO
 from config import Config
 
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
+# Pins routed to the BCM2835 PWM peripheral (PWM0: 12/18, PWM1: 13/19)
+HARDWARE_PWM_PINS = (12, 13, 18, 19)
+PWM_FREQUENCY = 1000  # 1kHz
+
+# Direction pin levels: (LEFT_FORWARD, LEFT_BACKWARD, RIGHT_FORWARD, RIGHT_BACKWARD)
+# Written with a single GPIO.output() call so RPi.GPIO iterates the pins in C
+DIRECTION_LEVELS = {
+    'forward': (GPIO.LOW, GPIO.HIGH, GPIO.LOW, GPIO.HIGH),
+    'backward': (GPIO.HIGH, GPIO.LOW, GPIO.HIGH, GPIO.LOW),
+    'left': (GPIO.HIGH, GPIO.LOW, GPIO.LOW, GPIO.HIGH),
+    'right': (GPIO.LOW, GPIO.HIGH, GPIO.HIGH, GPIO.LOW),
+    'stop': (GPIO.LOW, GPIO.LOW, GPIO.LOW, GPIO.LOW),
+}
+
+
+class PigpioPWM:
+    """
+    DMA-timed PWM channel backed by the pigpio daemon.
+    Mirrors the RPi.GPIO PWM interface (start/ChangeDutyCycle/stop) so it can
+    be swapped in without touching the motor helpers. Uses the hardware PWM
+    peripheral on pins that support it, pigpio's DMA software PWM otherwise.
+    """
+    
+    def __init__(self, pi, pin, frequency):
+        self.pi = pi
+        self.pin = pin
+        self.frequency = frequency
+        self.hardware = pin in HARDWARE_PWM_PINS
+        
+        if not self.hardware:
+            self.pi.set_mode(pin, pigpio.OUTPUT)
+            self.pi.set_PWM_frequency(pin, frequency)
+            self.pi.set_PWM_range(pin, 100)  # Duty cycle maps 1:1 to 0-100
+    
+    def start(self, duty_cycle):
+        self.ChangeDutyCycle(duty_cycle)
+    
+    def ChangeDutyCycle(self, duty_cycle):
+        if self.hardware:
+            # hardware_PWM takes duty in millionths (0-1000000)
+            self.pi.hardware_PWM(self.pin, self.frequency, int(duty_cycle * 10000))
+        else:
+            self.pi.set_PWM_dutycycle(self.pin, int(duty_cycle))
+    
+    def stop(self):
+        self.ChangeDutyCycle(0)
+
+
 class MotorController:
     """Controls robot movement via L298N motor driver"""
     
@@ -13,50 +66,76 @@ class MotorController:
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(False)
         
+        self.direction_pins = (
+            Config.MOTOR_LEFT_FORWARD,
+            Config.MOTOR_LEFT_BACKWARD,
+            Config.MOTOR_RIGHT_FORWARD,
+            Config.MOTOR_RIGHT_BACKWARD,
+        )
+        
         # Setup motor pins
         self._setup_motor_pins()
         
         # Initialize PWM for speed control
-        self.left_pwm = GPIO.PWM(Config.MOTOR_LEFT_ENABLE, 1000)  # 1kHz frequency
-        self.right_pwm = GPIO.PWM(Config.MOTOR_RIGHT_ENABLE, 1000)
+        # Prefer pigpio's DMA-timed PWM; RPi.GPIO's software PWM thread jitters
+        self.pi = self._connect_pigpio()
+        if self.pi is not None:
+            self.left_pwm = PigpioPWM(self.pi, Config.MOTOR_LEFT_ENABLE, PWM_FREQUENCY)
+            self.right_pwm = PigpioPWM(self.pi, Config.MOTOR_RIGHT_ENABLE, PWM_FREQUENCY)
+        else:
+            self.left_pwm = GPIO.PWM(Config.MOTOR_LEFT_ENABLE, PWM_FREQUENCY)
+            self.right_pwm = GPIO.PWM(Config.MOTOR_RIGHT_ENABLE, PWM_FREQUENCY)
         
         self.left_pwm.start(0)
         self.right_pwm.start(0)
         
+        # Last duty written per channel; ChangeDutyCycle is skipped when unchanged
+        self.left_duty = 0
+        self.right_duty = 0
+        
         self.current_speed = Config.DEFAULT_MOTOR_SPEED
         
         if Config.DEBUG:
-            print("[MotorController] Initialized successfully")
+            backend = "pigpio" if self.pi is not None else "RPi.GPIO software"
+            print(f"[MotorController] Initialized successfully ({backend} PWM)")
+    
+    def _connect_pigpio(self):
+        """Connect to the pigpio daemon, or return None to fall back to RPi.GPIO"""
+        if pigpio is None or not Config.USE_PIGPIO:
+            return None
+        
+        pi = pigpio.pi()
+        if not pi.connected:
+            if Config.DEBUG:
+                print("[MotorController] pigpiod not running, using software PWM")
+            return None
+        return pi
     
     def _setup_motor_pins(self):
         """Configure GPIO pins for motor control"""
-        # Left motor pins
-        GPIO.setup(Config.MOTOR_LEFT_FORWARD, GPIO.OUT)
-        GPIO.setup(Config.MOTOR_LEFT_BACKWARD, GPIO.OUT)
-        GPIO.setup(Config.MOTOR_LEFT_ENABLE, GPIO.OUT)
-        
-        # Right motor pins
-        GPIO.setup(Config.MOTOR_RIGHT_FORWARD, GPIO.OUT)
-        GPIO.setup(Config.MOTOR_RIGHT_BACKWARD, GPIO.OUT)
-        GPIO.setup(Config.MOTOR_RIGHT_ENABLE, GPIO.OUT)
-        
-        # Initialize all to LOW
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.LOW)
+        # Direction + enable pins as outputs, all driven LOW, in one bulk call
+        motor_pins = list(self.direction_pins) + [Config.MOTOR_LEFT_ENABLE, Config.MOTOR_RIGHT_ENABLE]
+        GPIO.setup(motor_pins, GPIO.OUT, initial=GPIO.LOW)
+    
+    def _set_direction(self, direction):
+        """Write all four direction pins in one call"""
+        GPIO.output(self.direction_pins, DIRECTION_LEVELS[direction])
+    
+    def _set_duty(self, left_speed, right_speed):
+        """Apply PWM duty cycle to both enable pins, skipping unchanged channels"""
+        if left_speed != self.left_duty:
+            self.left_pwm.ChangeDutyCycle(left_speed)
+            self.left_duty = left_speed
+        if right_speed != self.right_duty:
+            self.right_pwm.ChangeDutyCycle(right_speed)
+            self.right_duty = right_speed
     
     def forward(self, speed=None):
         """Move robot forward"""
         speed = speed or self.current_speed
         
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.HIGH)
-        
-        self.left_pwm.ChangeDutyCycle(speed)
-        self.right_pwm.ChangeDutyCycle(speed)
+        self._set_direction('forward')
+        self._set_duty(speed, speed)
         
         if Config.DEBUG:
             print(f"[MotorController] Moving forward at speed {speed}")
@@ -65,13 +144,8 @@ class MotorController:
         """Move robot backward"""
         speed = speed or self.current_speed
         
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.LOW)
-        
-        self.left_pwm.ChangeDutyCycle(speed)
-        self.right_pwm.ChangeDutyCycle(speed)
+        self._set_direction('backward')
+        self._set_duty(speed, speed)
         
         if Config.DEBUG:
             print(f"[MotorController] Moving backward at speed {speed}")
@@ -80,13 +154,8 @@ class MotorController:
         """Turn robot left"""
         speed = speed or Config.TURN_MOTOR_SPEED
         
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.HIGH)
-        
-        self.left_pwm.ChangeDutyCycle(speed)
-        self.right_pwm.ChangeDutyCycle(speed)
+        self._set_direction('left')
+        self._set_duty(speed, speed)
         
         if Config.DEBUG:
             print(f"[MotorController] Turning left at speed {speed}")
@@ -95,26 +164,16 @@ class MotorController:
         """Turn robot right"""
         speed = speed or Config.TURN_MOTOR_SPEED
         
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.LOW)
-        
-        self.left_pwm.ChangeDutyCycle(speed)
-        self.right_pwm.ChangeDutyCycle(speed)
+        self._set_direction('right')
+        self._set_duty(speed, speed)
         
         if Config.DEBUG:
             print(f"[MotorController] Turning right at speed {speed}")
     
     def stop(self):
         """Stop all motors"""
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.LOW)
-        
-        self.left_pwm.ChangeDutyCycle(0)
-        self.right_pwm.ChangeDutyCycle(0)
+        self._set_direction('stop')
+        self._set_duty(0, 0)
         
         if Config.DEBUG:
             print("[MotorController] Stopped")
@@ -128,15 +187,9 @@ class MotorController:
             left_speed: Speed for left motor (0-100)
             right_speed: Speed for right motor (0-100)
         """
-        # Left motor - backward or slower
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.LOW)
-        self.left_pwm.ChangeDutyCycle(left_speed)
-        
-        # Right motor - forward or faster
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.HIGH)
-        self.right_pwm.ChangeDutyCycle(right_speed)
+        # Left motor backward or slower, right motor forward or faster
+        self._set_direction('left')
+        self._set_duty(left_speed, right_speed)
         
         if Config.DEBUG:
             print(f"[MotorController] Differential left: L={left_speed}, R={right_speed}")
@@ -150,15 +203,9 @@ class MotorController:
             left_speed: Speed for left motor (0-100)
             right_speed: Speed for right motor (0-100)
         """
-        # Left motor - forward or faster
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.HIGH)
-        self.left_pwm.ChangeDutyCycle(left_speed)
-        
-        # Right motor - backward or slower
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.LOW)
-        self.right_pwm.ChangeDutyCycle(right_speed)
+        # Left motor forward or faster, right motor backward or slower
+        self._set_direction('right')
+        self._set_duty(left_speed, right_speed)
         
         if Config.DEBUG:
             print(f"[MotorController] Differential right: L={left_speed}, R={right_speed}")
@@ -177,13 +224,8 @@ class MotorController:
         right_speed = max(0, min(100, right_speed))
         
         # Both motors forward, just at different speeds
-        GPIO.output(Config.MOTOR_LEFT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_LEFT_BACKWARD, GPIO.HIGH)
-        GPIO.output(Config.MOTOR_RIGHT_FORWARD, GPIO.LOW)
-        GPIO.output(Config.MOTOR_RIGHT_BACKWARD, GPIO.HIGH)
-        
-        self.left_pwm.ChangeDutyCycle(left_speed)
-        self.right_pwm.ChangeDutyCycle(right_speed)
+        self._set_direction('forward')
+        self._set_duty(left_speed, right_speed)
         
         if Config.DEBUG:
             print(f"[MotorController] Differential forward: L={left_speed:.1f}, R={right_speed:.1f}")
@@ -214,5 +256,8 @@ class MotorController:
             if Config.DEBUG:
                 print(f"[MotorController] Error stopping right PWM: {e}")
         
+        if self.pi is not None:
+            self.pi.stop()
+        
         if Config.DEBUG:
             print("[MotorController] Cleaned up")
@@ -5,6 +5,7 @@ Handles connection, message sending/receiving, and reconnection
 import asyncio
 import json
 import websockets
+from websockets.protocol import State
 from datetime import datetime
 from config import Config
 
@@ -30,6 +31,10 @@ class WebSocketClient:
     
     async def connect(self):
         """Establish WebSocket connection to gateway"""
+        # Reuse an open connection instead of paying the TCP + upgrade handshake again
+        if self.connected and self.websocket is not None and self.websocket.state is State.OPEN:
+            return True
+        
         try:
             if Config.DEBUG:
                 print(f"[WebSocketClient] Connecting to {self.base_url}...")
@@ -149,10 +154,14 @@ class WebSocketClient:
         except websockets.exceptions.ConnectionClosed:
             if Config.DEBUG:
                 print("[WebSocketClient] Connection closed")
-            self.connected = False
         except Exception as e:
             if Config.DEBUG:
                 print(f"[WebSocketClient] Receive error: {e}")
+        else:
+            # Clean close (1000/1001) ends the loop without raising
+            if Config.DEBUG:
+                print("[WebSocketClient] Connection closed by gateway")
+        finally:
             self.connected = False
     
     async def run_with_reconnect(self):
@@ -8,13 +8,17 @@ Simple program to test motor functionality with a predefined sequence:
 4. Take a photo and save to desktop
 5. Drive backwards for 2 seconds and stop
 """
-import time
 import os
 from datetime import datetime
 import RPi.GPIO as GPIO
 from hardware.motors import MotorController
 from hardware.camera import Camera
 from config import Config
+from utils import PhaseTimer
+
+# Resolved once at startup so the timed sequence doesn't pay for it
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RUN_ID = datetime.now().strftime('%Y%m%d_%H%M%S')
 
 def main():
     """Run motor test sequence"""
@@ -40,44 +44,46 @@ def main():
         print(f"[Test] Failed to initialize camera: {e}")
         print("[Test] Continuing without camera...\n")
     
+    timer = PhaseTimer()
+    
     try:
         # Sequence 1: Forward for 2 seconds
         print("[Test] Moving FORWARD for 2 seconds...")
         motors.forward()
-        time.sleep(2)
+        timer.hold("forward", 2)
         
         # Stop for 1 second
         print("[Test] STOPPING for 1 second...")
         motors.stop()
-        time.sleep(1)
+        timer.hold("stop", 1)
         
         # Sequence 2: Turn right, then forward
         print("[Test] Turning RIGHT...")
         motors.turn_right()
-        time.sleep(1.0)  # Gentle turn
+        timer.hold("turn_right", 1.0)  # Gentle turn
         
         print("[Test] Moving FORWARD for 2 seconds...")
         motors.forward()
-        time.sleep(2)
+        timer.hold("forward", 2)
         
         # Stop for 1 second
         print("[Test] STOPPING for 1 second...")
         motors.stop()
-        time.sleep(1)
+        timer.hold("stop", 1)
         
         # Sequence 3: Turn left, then forward
         print("[Test] Turning LEFT...")
         motors.turn_left()
-        time.sleep(1.0)  # Gentle turn
+        timer.hold("turn_left", 1.0)  # Gentle turn
         
         print("[Test] Moving FORWARD for 2 seconds...")
         motors.forward()
-        time.sleep(2)
+        timer.hold("forward", 2)
         
         # Stop
         print("[Test] STOPPING...")
         motors.stop()
-        time.sleep(1)
+        timer.hold("stop", 1)
         
         # Take a photo and save to desktop
         if camera:
@@ -85,12 +91,9 @@ def main():
             try:
                 image = camera.capture_frame()
                 if image:
-                    # Get script directory
-                    script_dir = os.path.dirname(os.path.abspath(__file__))
-                    # Create filename with timestamp
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f'medirunner_photo_{timestamp}.jpg'
-                    filepath = os.path.join(script_dir, filename)
+                    # Filename is stamped with the run's start time
+                    filename = f'medirunner_photo_{RUN_ID}.jpg'
+                    filepath = os.path.join(SCRIPT_DIR, filename)
                     
                     # Save image
                     image.save(filepath, 'JPEG')
@@ -102,17 +105,21 @@ def main():
         else:
             print("[Test] Skipping photo (camera not available)")
         
-        time.sleep(1)
+        # Photo capture time varies; restart the schedule from here
+        timer.resync()
+        timer.hold("pause", 1)
         
         # Sequence 4: Backward for 2 seconds
         print("[Test] Moving BACKWARD for 2 seconds...")
         motors.backward()
-        time.sleep(2)
+        timer.hold("backward", 2)
         
         # Final stop
         print("[Test] STOPPING - Test complete!")
         motors.stop()
         
+        timer.report()
+        
         print("\n" + "=" * 60)
         print("Motor Test - COMPLETED SUCCESSFULLY")
         print("=" * 60)
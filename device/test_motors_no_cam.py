@@ -11,10 +11,10 @@ Simple program to test motor functionality with a predefined sequence:
 7. Drive backwards for 2 seconds
 8. Stop
 """
-import time
 import RPi.GPIO as GPIO
 from hardware.motors import MotorController
 from config import Config
+from utils import PhaseTimer
 
 def main():
     """Run motor test sequence"""
@@ -30,46 +30,50 @@ def main():
         print(f"[Test] Failed to initialize motors: {e}")
         return
     
+    timer = PhaseTimer()
+    
     try:
         # Sequence 1: Forward for 2 seconds
         print("[Test] Moving FORWARD for 2 seconds...")
         motors.forward()
-        time.sleep(2)
+        timer.hold("forward", 2)
         
         # Stop for 1 second
         print("[Test] STOPPING for 1 second...")
         motors.stop()
-        time.sleep(1)
+        timer.hold("stop", 1)
         
         # Sequence 2: Turn right for 2 seconds
         print("[Test] Turning RIGHT for 2 seconds...")
         motors.turn_right()
-        time.sleep(2)
+        timer.hold("turn_right", 2)
         
         # Stop for 1 second
         print("[Test] STOPPING for 1 second...")
         motors.stop()
-        time.sleep(1)
+        timer.hold("stop", 1)
         
         # Sequence 3: Turn left for 2 seconds
         print("[Test] Turning LEFT for 2 seconds...")
         motors.turn_left()
-        time.sleep(2)
+        timer.hold("turn_left", 2)
         
         # Stop for 1 second
         print("[Test] STOPPING for 1 second...")
         motors.stop()
-        time.sleep(1)
+        timer.hold("stop", 1)
         
         # Sequence 4: Backward for 2 seconds
         print("[Test] Moving BACKWARD for 2 seconds...")
         motors.backward()
-        time.sleep(2)
+        timer.hold("backward", 2)
         
         # Final stop
         print("[Test] STOPPING - Test complete!")
         motors.stop()
         
+        timer.report()
+        
         print("\n" + "=" * 60)
         print("Motor Test - COMPLETED SUCCESSFULLY")
         print("=" * 60)
@@ -8,6 +8,7 @@ import sys
 import RPi.GPIO as GPIO
 from hardware.sensors import SensorArray
 from config import Config
+from utils import rt_priority
 
 def format_sensor_display(sensor_data):
     """
@@ -59,6 +60,22 @@ def format_sensor_display_simple(sensor_data):
     
     return display
 
+def pack_sensor_word(sensor_data):
+    """
+    Pack all sensor states into one int so a change can be detected with a
+    single comparison
+    """
+    line = sensor_data['line_sensors']
+    return (
+        line['left2']
+        | (line['left1'] << 1)
+        | (line['center'] << 2)
+        | (line['right1'] << 3)
+        | (line['right2'] << 4)
+        | (bool(sensor_data['proximity']) << 5)
+        | (bool(sensor_data['bump']) << 6)
+    )
+
 def main():
     """Main test loop"""
     print("=" * 80)
@@ -88,12 +105,27 @@ def main():
     # Choose display format
     use_fancy_display = True  # Set to False if unicode characters cause issues
     
+    # Redraw at least this often even if nothing changed
+    refresh_interval = 0.5
+    
     try:
         # Main read loop
         iteration = 0
+        last_word = -1
+        last_draw = 0.0
         while True:
-            # Read all sensors
-            sensor_data = sensors.read_all()
+            # Read all sensors (only the GPIO reads run at RT priority)
+            with rt_priority():
+                sensor_data = sensors.read_all()
+            
+            # Only redraw when a sensor changed or the refresh interval elapsed
+            word = pack_sensor_word(sensor_data)
+            now = time.monotonic()
+            if word == last_word and now - last_draw < refresh_interval:
+                time.sleep(0.1)
+                continue
+            last_word = word
+            last_draw = now
             
             # Format and display
             if use_fancy_display:
@@ -110,13 +142,13 @@ def main():
             # Use \r to return to start of line
             print(f"\r{display_line}", end='', flush=True)
             
-            # Optional: Print newline every N iterations for logging
+            # Optional: Print newline every N redraws for logging
             iteration += 1
-            if iteration % 20 == 0:  # New line every 20 reads (for scroll back)
+            if iteration % 20 == 0:  # New line every 20 redraws (for scroll back)
                 print()  # New line
             
             # Small delay to avoid flooding
-            time.sleep(0.1)  # 10Hz update rate
+            time.sleep(0.1)  # 10Hz poll rate
     
     except KeyboardInterrupt:
         print("\n\n[Test] Interrupted by user")
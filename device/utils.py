@@ -3,10 +3,69 @@
 Robot Utilities
 Helper scripts for debugging and testing
 """
+import os
 import sys
 import time
+from contextlib import contextmanager
 from config import Config
 
+# Carriage return + ANSI "erase entire line"
+CLEAR_LINE = '\r\x1b[2K'
+
+
+@contextmanager
+def rt_priority(priority=80):
+    """
+    Run the enclosed block under SCHED_FIFO, dropping back to SCHED_OTHER on exit.
+    Keep the block tight (GPIO reads/writes only) so prints to a slow TTY never
+    hold RT priority. No-op without root/CAP_SYS_NICE or on non-Linux hosts.
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        elevated = True
+    except (AttributeError, OSError):
+        elevated = False
+    
+    try:
+        yield
+    finally:
+        if elevated:
+            os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+
+
+class PhaseTimer:
+    """
+    Paces a timed test sequence against absolute CLOCK_MONOTONIC deadlines.
+    Each phase ends at (sequence start + sum of durations), so time spent on
+    prints and GPIO calls doesn't accumulate as drift. Records how late each
+    phase actually ended for the end-of-run report.
+    """
+    
+    def __init__(self):
+        self.deadline = time.monotonic_ns()
+        self.phases = []  # (name, lateness_ns)
+    
+    def hold(self, name, duration):
+        """Wait until the current phase's absolute deadline"""
+        self.deadline += int(duration * 1_000_000_000)
+        remaining = self.deadline - time.monotonic_ns()
+        if remaining > 0:
+            time.sleep(remaining / 1_000_000_000)
+        self.phases.append((name, time.monotonic_ns() - self.deadline))
+    
+    def resync(self):
+        """Restart the schedule from now (after an untimed step, e.g. a photo)"""
+        self.deadline = time.monotonic_ns()
+    
+    def report(self):
+        """Print min/avg/max phase-end lateness"""
+        if not self.phases:
+            return
+        drifts_ms = [lateness / 1_000_000 for _, lateness in self.phases]
+        print(f"[Timing] {len(drifts_ms)} phases, end drift "
+              f"min={min(drifts_ms):.3f}ms avg={sum(drifts_ms) / len(drifts_ms):.3f}ms "
+              f"max={max(drifts_ms):.3f}ms")
+
 def show_config():
     """Display current configuration"""
     Config.display()
@@ -39,8 +98,12 @@ def check_gpio_pins():
     print(f"  Buzzer: GPIO {Config.BUZZER_PIN}")
     print("=" * 50)
 
-def test_websocket():
-    """Test WebSocket connection to gateway"""
+def test_websocket(count=1):
+    """
+    Test WebSocket connection to gateway
+    Args:
+        count: Number of test messages to send over the same connection
+    """
     import asyncio
     from network import WebSocketClient
     
@@ -58,13 +121,15 @@ def test_websocket():
             print("✓ Connection successful!")
             print(f"✓ Registered as: {Config.ROBOT_ID}")
             
-            # Send test message
-            print("\nSending test telemetry...")
-            await client.send_telemetry({
-                "test": True,
-                "message": "Test from utilities script"
-            })
-            print("✓ Test message sent")
+            # Send test messages over the single open connection
+            print(f"\nSending {count} test telemetry message(s)...")
+            for seq in range(count):
+                await client.send_telemetry({
+                    "test": True,
+                    "seq": seq,
+                    "message": "Test from utilities script"
+                })
+            print(f"✓ {count} test message(s) sent")
             
             await client.close()
         else:
@@ -93,12 +158,9 @@ def monitor_sensors():
             data = sensors.read_all()
             line_pos = sensors.get_line_position()
             
-            # Clear line and print
-            sys.stdout.write('\r')
-            sys.stdout.write(' ' * 100)
-            sys.stdout.write('\r')
-            
-            output = f"Line: {data['line_sensors']} | Pos: {line_pos:8s} | "
+            # Clear line and print in a single write
+            output = CLEAR_LINE
+            output += f"Line: {data['line_sensors']} | Pos: {line_pos:8s} | "
             output += f"Prox: {'YES' if data['proximity'] else 'NO ':3s} | "
             output += f"Bump: {'YES' if data['bump'] else 'NO ':3s}"
             
@@ -122,7 +184,8 @@ def main():
         elif command == 'pins':
             check_gpio_pins()
         elif command == 'websocket':
-            test_websocket()
+            count = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+            test_websocket(count)
         elif command == 'monitor':
             monitor_sensors()
         else:
@@ -138,7 +201,7 @@ def show_usage():
     print("\nCommands:")
     print("  config     - Display current configuration")
     print("  pins       - Show GPIO pin mappings")
-    print("  websocket  - Test WebSocket connection to gateway")
+    print("  websocket  - Test WebSocket connection to gateway [count]")
     print("  monitor    - Monitor sensor readings in real-time")
     print("\nExamples:")
     print("  python3 utils.py config")
@@ -6,12 +6,17 @@ from fastapi import APIRouter
 
 from .connection_manager import ConnectionManager
 
-router = APIRouter()
+
+def _now_ms() -> int:
+    """Current epoch time in milliseconds (integer math, no float round-trip)."""
+    return time.time_ns() // 1_000_000
 
 
 def create_api_router(manager: ConnectionManager) -> APIRouter:
     """Create API router with connection manager dependency."""
     
+    router = APIRouter()
+    
     @router.get("/")
     async def root():
         """API documentation endpoint."""
@@ -26,14 +31,14 @@ def create_api_router(manager: ConnectionManager) -> APIRouter:
     @router.get("/health")
     async def health():
         """Health check endpoint."""
-        return {"status": "healthy", "timestamp": int(time.time() * 1000)}
+        return {"status": "healthy", "timestamp": _now_ms()}
 
     @router.get("/status")
     async def status():
         """Get connection status for all robots."""
         return {
             "connections": manager.get_all_connections(),
-            "timestamp": int(time.time() * 1000)
+            "timestamp": _now_ms()
         }
 
     @router.get("/status/{robot_id}")
@@ -42,7 +47,7 @@ def create_api_router(manager: ConnectionManager) -> APIRouter:
         return {
             "robot_id": robot_id,
             **manager.get_robot_status(robot_id),
-            "timestamp": int(time.time() * 1000)
+            "timestamp": _now_ms()
         }
 
     return router
\ No newline at end of file
@@ -8,12 +8,14 @@ import face_recognition
 import numpy as np
 from PIL import Image
 from io import BytesIO
+import asyncio
 import base64
+import json
 import os
 from pathlib import Path
 from typing import Optional, Tuple
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel
 
 
@@ -33,6 +35,9 @@ class FaceLoginResponse(BaseModel):
 # Face Recognition Configuration
 FACE_MATCH_THRESHOLD = 0.55
 ADMIN_IMAGE_FILENAME = "admin.jpg"
+ADMIN_ENCODING_FILENAME = "admin.npy"  # Cached encoding of admin.jpg
+ADMIN_META_FILENAME = "admin.meta.json"  # admin.jpg mtime the cache was built from
+MAX_IMAGE_SIDE = 640  # Login images are downscaled to this before detection
 
 
 class FaceAuthenticator:
@@ -57,6 +62,21 @@ class FaceAuthenticator:
             print("Face login will not work until admin.jpg is added to the gateway folder.")
             return
         
+        encoding_path = gateway_root / ADMIN_ENCODING_FILENAME
+        meta_path = gateway_root / ADMIN_META_FILENAME
+        image_mtime = admin_image_path.stat().st_mtime_ns
+        
+        # Reuse the cached encoding unless admin.jpg has changed since it was built
+        try:
+            if encoding_path.exists() and meta_path.exists():
+                meta = json.loads(meta_path.read_text())
+                if meta.get("image_mtime_ns") == image_mtime:
+                    self.admin_encoding = np.load(encoding_path)
+                    print(f"✓ Admin face encoding loaded from cache {encoding_path}")
+                    return
+        except Exception as e:
+            print(f"WARNING: Ignoring unreadable admin encoding cache: {e}")
+        
         try:
             # Load the admin image
             admin_image = face_recognition.load_image_file(str(admin_image_path))
@@ -77,6 +97,15 @@ class FaceAuthenticator:
             
         except Exception as e:
             print(f"ERROR: Failed to load admin face: {e}")
+            return
+        
+        # The encoding is loaded either way; a failed cache write only costs
+        # a re-encode on the next start
+        try:
+            np.save(encoding_path, self.admin_encoding)
+            meta_path.write_text(json.dumps({"image_mtime_ns": image_mtime}))
+        except Exception as e:
+            print(f"WARNING: Could not write admin encoding cache: {e}")
     
     def verify_face(self, base64_image: str) -> Tuple[bool, Optional[str]]:
         """
@@ -85,6 +114,23 @@ class FaceAuthenticator:
         Args:
             base64_image: Base64 encoded image string
             
+        Returns:
+            Tuple of (success: bool, message: Optional[str])
+        """
+        try:
+            image_data = base64.b64decode(base64_image)
+        except Exception as e:
+            print(f"ERROR in face verification: {e}")
+            return False, f"Error processing image: {str(e)}"
+        return self.verify_face_bytes(image_data)
+    
+    def verify_face_bytes(self, image_data: bytes) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a face from raw (already decoded) image file bytes.
+        
+        Args:
+            image_data: Encoded image file contents (JPEG/PNG)
+            
         Returns:
             Tuple of (success: bool, message: Optional[str])
         """
@@ -93,15 +139,19 @@ class FaceAuthenticator:
             return False, "System not configured for face login"
         
         try:
-            # Decode base64 image
-            image_data = base64.b64decode(base64_image)
             image = Image.open(BytesIO(image_data))
             
+            # Downscale large selfies once; HOG cost scales with pixel count
+            image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+            
             # Convert PIL image to numpy array for face_recognition
             image_array = np.array(image)
             
-            # Detect faces in the uploaded image
-            face_locations = face_recognition.face_locations(image_array)
+            # Detect faces in the uploaded image (no upsampling - a login
+            # selfie face is already large at this resolution)
+            face_locations = face_recognition.face_locations(
+                image_array, number_of_times_to_upsample=0, model="hog"
+            )
             
             if len(face_locations) == 0:
                 return False, "No face detected in image"
@@ -151,8 +201,37 @@ def create_auth_router() -> APIRouter:
         Returns:
             FaceLoginResponse with success status and user info
         """
-        # Verify the face
-        success, message = face_authenticator.verify_face(request.image)
+        # Verify the face off the event loop so concurrent logins (and the
+        # robot/console websockets) are not stalled behind dlib
+        success, message = await asyncio.to_thread(face_authenticator.verify_face, request.image)
+        
+        if success:
+            return FaceLoginResponse(
+                success=True,
+                user="admin",
+                message=message
+            )
+        else:
+            return FaceLoginResponse(
+                success=False,
+                message=message
+            )
+    
+    @router.post("/face-login/upload", response_model=FaceLoginResponse)
+    async def face_login_upload(image: UploadFile = File(...)) -> FaceLoginResponse:
+        """
+        Authenticate user via face recognition from a multipart image upload.
+        
+        Same as /face-login but skips the base64 encoding of the image.
+        
+        Args:
+            image: Uploaded image file
+            
+        Returns:
+            FaceLoginResponse with success status and user info
+        """
+        image_bytes = await image.read()
+        success, message = await asyncio.to_thread(face_authenticator.verify_face_bytes, image_bytes)
         
         if success:
             return FaceLoginResponse(
@@ -6,14 +6,66 @@ from fastapi import APIRouter, UploadFile, File, HTTPException
 from typing import Dict, List
 import cv2
 import numpy as np
-from PIL import Image
-import io
 import json
 import os
 from pathlib import Path
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional - fall back to the NumPy LBP path
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib json module
+    orjson = None
+
+try:
+    import hnswlib
+except ImportError:  # hnswlib is optional - verify falls back to the linear scan
+    hnswlib = None
+
 # Storage for enrolled users
 STORAGE_FILE = Path(__file__).parent.parent / "enrolled_users_opencv.json"
+# Normalised int8-quantised feature rows, ordered by the 'names' list in STORAGE_FILE
+FEATURES_FILE = STORAGE_FILE.with_suffix('.npy')
+# HNSW index over FEATURES_FILE rows (labels are row numbers), saved after the matrix
+INDEX_FILE = STORAGE_FILE.with_suffix('.hnsw')
+
+# Enrolment size at which verify switches from a linear scan to an HNSW index
+HNSW_MIN_USERS = 1000
+
+# Haar detection runs on a copy downscaled to at most this many pixels on the long edge
+DETECT_MAX_SIDE = 640
+
+# Optional YuNet DNN face detector model (download from the OpenCV model zoo);
+# the Haar cascade is used when the model file is not present
+YUNET_MODEL = Path(os.getenv(
+    "YUNET_MODEL_PATH",
+    Path(__file__).parent.parent / "face_detection_yunet_2023mar.onnx"
+))
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _lbp_kernel(image, out):
+        """Write 8-neighbour LBP codes for interior pixels of image into out"""
+        height, width = image.shape
+        for i in prange(1, height - 1):
+            for j in range(1, width - 1):
+                center = image[i, j]
+                code = 0
+                if image[i-1, j-1] >= center: code |= 128
+                if image[i-1, j] >= center: code |= 64
+                if image[i-1, j+1] >= center: code |= 32
+                if image[i, j+1] >= center: code |= 16
+                if image[i+1, j+1] >= center: code |= 8
+                if image[i+1, j] >= center: code |= 4
+                if image[i+1, j-1] >= center: code |= 2
+                if image[i, j-1] >= center: code |= 1
+                out[i, j] = code
+else:
+    _lbp_kernel = None
+
 
 class OpenCVFaceRecognizer:
     """Face recognition using OpenCV (no dlib dependency)"""
@@ -22,61 +74,247 @@ class OpenCVFaceRecognizer:
         # Load OpenCV's pre-trained face detector (Haar Cascade)
         cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
         self.face_cascade = cv2.CascadeClassifier(cascade_path)
+        self.face_detector = self._load_yunet()
         
         # Initialize face recognizer (LBPH - Local Binary Patterns Histograms)
         self.recognizer = cv2.face.LBPHFaceRecognizer_create()
         self.enrolled_users = {}
+        # L2-normalised feature rows quantised to int8, parallel to _enrolled_names
+        self._enrolled_matrix = np.empty((0, 0), dtype=np.int8)
+        self._enrolled_names: List[str] = []
+        self._index = None
         self.load_enrolled_users()
     
     def load_enrolled_users(self):
         """Load enrolled users from storage"""
         if STORAGE_FILE.exists():
-            with open(STORAGE_FILE, 'r') as f:
-                data = json.load(f)
-                self.enrolled_users = data.get('users', {})
-                print(f"[OPENCV] Loaded {len(self.enrolled_users)} enrolled user(s)")
+            with open(STORAGE_FILE, 'rb') as f:
+                raw = f.read()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            self.enrolled_users = data.get('users', {})
+            if 'names' in data and FEATURES_FILE.exists():
+                self._enrolled_names = data['names']
+                # Memory-mapped read-only so worker processes share the pages
+                self._enrolled_matrix = np.load(FEATURES_FILE, mmap_mode='r')
+                if self._enrolled_matrix.dtype != np.int8:
+                    self._enrolled_matrix = self._quantise(self._enrolled_matrix)
+                # The matrix and JSON are replaced one after another and deletes
+                # move the last row into the freed slot, so after an interrupted
+                # save the names would label other users' features
+                if self._enrolled_matrix.ndim != 2 \
+                        or len(self._enrolled_names) != self._enrolled_matrix.shape[0] \
+                        or set(self._enrolled_names) != set(self.enrolled_users):
+                    print(f"[OPENCV] ERROR: {FEATURES_FILE.name} (shape {self._enrolled_matrix.shape}) does not "
+                          f"match the {len(self._enrolled_names)} names in {STORAGE_FILE.name} - the files are "
+                          f"out of sync (interrupted save?). Starting with no enrolled users; please re-enroll.")
+                    self.enrolled_users = {}
+                    self._enrolled_names = []
+                    self._enrolled_matrix = np.empty((0, 0), dtype=np.int8)
+            elif 'names' in data:
+                # Current format but the feature matrix is gone - the metadata
+                # alone can't verify anyone, so start over rather than crash
+                print(f"[OPENCV] WARNING: {FEATURES_FILE.name} is missing - starting with no enrolled users")
+                self.enrolled_users = {}
+                self._enrolled_names = []
+                self._enrolled_matrix = np.empty((0, 0), dtype=np.int8)
+            else:
+                # Older storage kept features inline as JSON lists - migrate them
+                self._enrolled_names = list(self.enrolled_users.keys())
+                self._enrolled_matrix = np.empty((0, 0), dtype=np.int8)
+                if self._enrolled_names:
+                    features = [self.enrolled_users[name].pop('features') for name in self._enrolled_names]
+                    self._enrolled_matrix = self._quantise(self._normalise(np.array(features, dtype=np.float32)))
+                    self.save_enrolled_users()
+            print(f"[OPENCV] Loaded {len(self.enrolled_users)} enrolled user(s)")
         else:
             self.enrolled_users = {}
             print("[OPENCV] No enrolled users found")
+        self._load_index()
+    
+    def _normalise(self, features: np.ndarray) -> np.ndarray:
+        """L2-normalise a feature vector (or each row of a matrix) as float32"""
+        features = features.astype(np.float32)
+        features /= np.linalg.norm(features, axis=-1, keepdims=True)
+        return features
+    
+    def _quantise(self, unit_features: np.ndarray) -> np.ndarray:
+        """Quantise unit-length features to int8 (dot products scale by 127^2)"""
+        return np.round(unit_features * 127).astype(np.int8)
+    
+    def _store_features(self, username: str, features: np.ndarray):
+        """Insert or replace a user's row in the enrolled feature matrix"""
+        row = self._quantise(self._normalise(features))
+        if username in self._enrolled_names:
+            position = self._enrolled_names.index(username)
+            matrix = self._enrolled_matrix.copy()
+            matrix[position] = row
+            self._enrolled_matrix = matrix
+        elif self._enrolled_names:
+            position = len(self._enrolled_names)
+            self._enrolled_matrix = np.vstack([self._enrolled_matrix, row])
+            self._enrolled_names.append(username)
+        else:
+            position = 0
+            self._enrolled_matrix = row[np.newaxis, :]
+            self._enrolled_names = [username]
+        self._update_index(position)
+    
+    def _remove_features(self, position: int):
+        """Remove a row by moving the last row into its place (keeps index labels stable)"""
+        last = len(self._enrolled_names) - 1
+        matrix = np.array(self._enrolled_matrix)
+        if position != last:
+            matrix[position] = matrix[last]
+            self._enrolled_names[position] = self._enrolled_names[last]
+        self._enrolled_matrix = matrix[:last]
+        self._enrolled_names.pop()
+        
+        if self._index is None:
+            return
+        if len(self._enrolled_names) < HNSW_MIN_USERS:
+            self._index = None
+            return
+        if position != last:
+            self._update_index(position)
+        self._index.mark_deleted(last)
+    
+    def _build_index(self):
+        """Build an inner-product HNSW index over enrolled rows for large enrolments"""
+        self._index = None
+        if hnswlib is None or len(self._enrolled_names) < HNSW_MIN_USERS:
+            return
+        data = self._enrolled_matrix.astype(np.float32) / 127
+        index = hnswlib.Index(space='ip', dim=data.shape[1])
+        index.init_index(max_elements=len(data), ef_construction=200, M=16)
+        index.add_items(data, np.arange(len(data)))
+        index.set_ef(50)
+        self._index = index
+        print(f"[OPENCV] Built HNSW index over {len(data)} enrolled user(s)")
+    
+    def _load_index(self):
+        """Load the saved HNSW index, rebuilding it if it is missing or older than the matrix"""
+        self._index = None
+        if hnswlib is None or len(self._enrolled_names) < HNSW_MIN_USERS:
+            return
+        if INDEX_FILE.exists() and INDEX_FILE.stat().st_mtime_ns >= FEATURES_FILE.stat().st_mtime_ns:
+            try:
+                index = hnswlib.Index(space='ip', dim=self._enrolled_matrix.shape[1])
+                index.load_index(str(INDEX_FILE), max_elements=len(self._enrolled_names))
+                index.set_ef(50)
+                self._index = index
+                print(f"[OPENCV] Loaded HNSW index from {INDEX_FILE.name}")
+                return
+            except Exception as e:
+                print(f"[OPENCV] WARNING: Ignoring unreadable HNSW index: {e}")
+        self._build_index()
+        self._save_index()
+    
+    def _update_index(self, position: int):
+        """Insert or replace one row in the HNSW index, building it once the enrolment is large enough"""
+        if self._index is None:
+            self._build_index()
+            return
+        if self._index.get_current_count() >= self._index.get_max_elements():
+            self._index.resize_index(2 * self._index.get_max_elements())
+        # Re-adding an existing (or deleted) label updates it in place
+        row = self._enrolled_matrix[position:position + 1].astype(np.float32) / 127
+        self._index.add_items(row, np.array([position]))
+    
+    def _save_index(self):
+        """Save the HNSW index next to the feature matrix (or remove a stale one)"""
+        if self._index is not None:
+            tmp_file = INDEX_FILE.with_suffix('.hnsw.tmp')
+            self._index.save_index(str(tmp_file))
+            os.replace(tmp_file, INDEX_FILE)
+        elif INDEX_FILE.exists():
+            INDEX_FILE.unlink()
     
     def save_enrolled_users(self):
         """Save enrolled users to storage"""
         STORAGE_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(STORAGE_FILE, 'w') as f:
-            json.dump({'users': self.enrolled_users}, f, indent=2)
+        # Write to a temp file and swap it in so other workers still mapping
+        # the old matrix keep a consistent view
+        tmp_file = FEATURES_FILE.with_suffix('.npy.tmp')
+        with open(tmp_file, 'wb') as f:
+            np.save(f, self._enrolled_matrix)
+        os.replace(tmp_file, FEATURES_FILE)
+        self._save_index()
+        payload = {'names': self._enrolled_names, 'users': self.enrolled_users}
+        tmp_file = STORAGE_FILE.with_suffix('.json.tmp')
+        if orjson is not None:
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(payload))
+        else:
+            with open(tmp_file, 'w') as f:
+                json.dump(payload, f)
+        os.replace(tmp_file, STORAGE_FILE)
         print(f"[OPENCV] Saved {len(self.enrolled_users)} enrolled user(s)")
     
-    def detect_faces(self, image_array: np.ndarray) -> List[tuple]:
+    def _load_yunet(self):
+        """Create the YuNet detector if the model file and OpenCV support exist"""
+        if not YUNET_MODEL.exists() or not hasattr(cv2, 'FaceDetectorYN_create'):
+            print("[OPENCV] Using Haar cascade face detector")
+            return None
+        print(f"[OPENCV] Using YuNet face detector: {YUNET_MODEL.name}")
+        return cv2.FaceDetectorYN_create(str(YUNET_MODEL), "", (320, 320))
+    
+    def decode_gray(self, image_bytes: bytes) -> np.ndarray:
+        """Decode uploaded image bytes straight to a grayscale array"""
+        gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise HTTPException(status_code=400, detail="Invalid image data")
+        return gray
+    
+    def detect_faces(self, gray: np.ndarray) -> List[tuple]:
         """
-        Detect faces in image using OpenCV Haar Cascade
+        Detect faces in a grayscale image using YuNet, or the Haar Cascade
+        when no YuNet model is available
         Returns list of (x, y, w, h) tuples
         """
-        gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
+        if self.face_detector is not None:
+            height, width = gray.shape[:2]
+            self.face_detector.setInputSize((width, height))
+            _, detections = self.face_detector.detect(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+            if detections is None:
+                return []
+            boxes = detections[:, :4].astype(np.int32)
+            # YuNet boxes can overhang the frame edge
+            boxes[:, :2] = np.maximum(boxes[:, :2], 0)
+            return [tuple(box) for box in boxes]
+        
+        # Cascade cost grows with pixel count, so search a downscaled copy
+        scale = 1.0
+        small = gray
+        if max(gray.shape[:2]) > DETECT_MAX_SIDE:
+            scale = DETECT_MAX_SIDE / max(gray.shape[:2])
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        # Faces in a login/enrollment shot fill a good part of the frame, so
+        # skip pyramid levels for anything smaller than 15% of the height
+        min_side = max(30, int(small.shape[0] * 0.15))
         faces = self.face_cascade.detectMultiScale(
-            gray,
+            small,
             scaleFactor=1.1,
             minNeighbors=5,
-            minSize=(30, 30)
+            minSize=(min_side, min_side)
         )
+        if scale != 1.0 and len(faces) > 0:
+            faces = (np.asarray(faces) / scale).astype(np.int32)
         return faces
     
-    def extract_face_features(self, image_array: np.ndarray, face_rect: tuple) -> np.ndarray:
+    def extract_face_features(self, gray: np.ndarray, face_rect: tuple) -> np.ndarray:
         """
         Extract face features using histogram comparison
-        Returns feature vector for the face region
+        Returns feature vector for the face region of a grayscale image
         """
         x, y, w, h = face_rect
-        face_roi = image_array[y:y+h, x:x+w]
-        
-        # Convert to grayscale
-        gray_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
+        gray_face = gray[y:y+h, x:x+w]
         
         # Resize to standard size (100x100)
         resized_face = cv2.resize(gray_face, (100, 100))
         
         # Compute histogram
-        hist = cv2.calcHist([resized_face], [0], None, [256], [0, 256])
-        hist = cv2.normalize(hist, hist).flatten()
+        hist = self._histogram(resized_face)
         
         # Also compute LBP features
         lbp = self._compute_lbp(resized_face)
@@ -89,44 +327,58 @@ class OpenCVFaceRecognizer:
     def _compute_lbp(self, image: np.ndarray) -> np.ndarray:
         """Compute Local Binary Pattern features"""
         lbp_image = np.zeros_like(image)
-        for i in range(1, image.shape[0] - 1):
-            for j in range(1, image.shape[1] - 1):
-                center = image[i, j]
-                code = 0
-                code |= (image[i-1, j-1] >= center) << 7
-                code |= (image[i-1, j] >= center) << 6
-                code |= (image[i-1, j+1] >= center) << 5
-                code |= (image[i, j+1] >= center) << 4
-                code |= (image[i+1, j+1] >= center) << 3
-                code |= (image[i+1, j] >= center) << 2
-                code |= (image[i+1, j-1] >= center) << 1
-                code |= (image[i, j-1] >= center) << 0
-                lbp_image[i, j] = code
+        if _lbp_kernel is not None:
+            _lbp_kernel(np.ascontiguousarray(image), lbp_image)
+        else:
+            lbp_image[1:-1, 1:-1] = self._lbp_codes(image)
         
         # Compute histogram of LBP image
-        hist = cv2.calcHist([lbp_image], [0], None, [256], [0, 256])
-        hist = cv2.normalize(hist, hist).flatten()
+        return self._histogram(lbp_image)
+    
+    def _histogram(self, image: np.ndarray) -> np.ndarray:
+        """L2-normalised 256-bin histogram of a uint8 image"""
+        hist = np.bincount(image.ravel(), minlength=256).astype(np.float32)
+        hist /= np.linalg.norm(hist) + 1e-9
         return hist
     
+    def _lbp_codes(self, image: np.ndarray) -> np.ndarray:
+        """NumPy LBP codes for the interior pixels (used when numba is missing)"""
+        # Compare each interior pixel against its 8 neighbours using shifted
+        # slices, clockwise from top-left (bit 7) to left (bit 0)
+        center = image[1:-1, 1:-1]
+        neighbours = (
+            image[:-2, :-2],   # top-left
+            image[:-2, 1:-1],  # top
+            image[:-2, 2:],    # top-right
+            image[1:-1, 2:],   # right
+            image[2:, 2:],     # bottom-right
+            image[2:, 1:-1],   # bottom
+            image[2:, :-2],    # bottom-left
+            image[1:-1, :-2],  # left
+        )
+        # Pack the 8 comparison bitmaps into one byte per pixel; packbits is
+        # MSB-first, so the top-left neighbour lands in bit 7
+        stack = np.stack([neighbour >= center for neighbour in neighbours])
+        return np.packbits(stack, axis=0)[0]
+    
     def compare_features(self, features1: np.ndarray, features2: np.ndarray) -> float:
         """
         Compare two feature vectors
         Returns similarity score (0-1, higher is more similar)
         """
-        # Use cosine similarity
-        similarity = np.dot(features1, features2) / (np.linalg.norm(features1) * np.linalg.norm(features2))
-        return float(similarity)
+        # Cosine similarity: a single dot product once both sides are unit
+        # length (enrolled rows are already stored normalised)
+        return float(np.dot(self._normalise(features1), self._normalise(features2)))
     
     def enroll_user(self, username: str, image_bytes: bytes) -> Dict:
         """Enroll a new user with their face image"""
         print(f"[OPENCV ENROLL] Processing enrollment for user: {username}")
         
-        # Convert bytes to numpy array
-        image = Image.open(io.BytesIO(image_bytes))
-        image_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        # Decode bytes directly to grayscale (detection and features only need luma)
+        gray = self.decode_gray(image_bytes)
         
         # Detect faces
-        faces = self.detect_faces(image_array)
+        faces = self.detect_faces(gray)
         
         if len(faces) == 0:
             print(f"[OPENCV ENROLL] ✗ No face detected")
@@ -140,13 +392,13 @@ class OpenCVFaceRecognizer:
         
         # Extract features from the first face
         face_rect = faces[0]
-        features = self.extract_face_features(image_array, face_rect)
+        features = self.extract_face_features(gray, face_rect)
         
         # Store user
         self.enrolled_users[username] = {
-            'features': features.tolist(),
             'face_rect': [int(x) for x in face_rect]
         }
+        self._store_features(username, features)
         self.save_enrolled_users()
         
         print(f"[OPENCV ENROLL] ✓ User enrolled successfully")
@@ -164,12 +416,11 @@ class OpenCVFaceRecognizer:
             print("[OPENCV VERIFY] ✗ No enrolled users")
             raise HTTPException(status_code=400, detail="No enrolled users. Please enroll first.")
         
-        # Convert bytes to numpy array
-        image = Image.open(io.BytesIO(image_bytes))
-        image_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        # Decode bytes directly to grayscale (detection and features only need luma)
+        gray = self.decode_gray(image_bytes)
         
         # Detect faces
-        faces = self.detect_faces(image_array)
+        faces = self.detect_faces(gray)
         
         if len(faces) == 0:
             print("[OPENCV VERIFY] ✗ No face detected")
@@ -179,25 +430,32 @@ class OpenCVFaceRecognizer:
         
         # Use first detected face
         face_rect = faces[0]
-        features = self.extract_face_features(image_array, face_rect)
+        features = self.extract_face_features(gray, face_rect)
         
         # Compare with all enrolled users
         print(f"[OPENCV VERIFY] Comparing against {len(self.enrolled_users)} enrolled user(s)")
         
-        best_match = None
-        best_similarity = 0.0
         SIMILARITY_THRESHOLD = 0.75  # Adjust this threshold (0.7-0.85 recommended)
         
-        for username, user_data in self.enrolled_users.items():
-            stored_features = np.array(user_data['features'])
-            similarity = self.compare_features(features, stored_features)
-            confidence = int(similarity * 100)
+        query = self._quantise(self._normalise(features))
+        if self._index is not None:
+            # Approximate nearest neighbour; hnswlib 'ip' distance is 1 - dot
+            labels, distances = self._index.knn_query(query.astype(np.float32) / 127, k=1)
+            best_index = int(labels[0][0])
+            best_similarity = float(1 - distances[0][0])
+        else:
+            # Cosine similarity against every enrolled user in one int8 matrix-vector
+            # product, accumulated in int32 to avoid overflow over 512 dimensions
+            dots = self._enrolled_matrix.astype(np.int32) @ query.astype(np.int32)
+            similarities = dots.astype(np.float32) / (127 * 127)
             
-            print(f"[OPENCV VERIFY] User: {username} | Similarity: {similarity:.2f} | Confidence: {confidence}%")
+            for username, similarity in zip(self._enrolled_names, similarities):
+                confidence = int(similarity * 100)
+                print(f"[OPENCV VERIFY] User: {username} | Similarity: {similarity:.2f} | Confidence: {confidence}%")
             
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_match = username
+            best_index = int(similarities.argmax())
+            best_similarity = float(similarities[best_index])
+        best_match = self._enrolled_names[best_index]
         
         if best_match and best_similarity >= SIMILARITY_THRESHOLD:
             print(f"[OPENCV VERIFY] ✓ Match found: {best_match} (similarity: {best_similarity:.2f})")
@@ -215,6 +473,7 @@ class OpenCVFaceRecognizer:
         """Delete an enrolled user"""
         if username in self.enrolled_users:
             del self.enrolled_users[username]
+            self._remove_features(self._enrolled_names.index(username))
             self.save_enrolled_users()
             print(f"[OPENCV] ✓ Deleted user: {username}")
             return {'success': True, 'message': f'User {username} deleted'}
@@ -10,19 +10,45 @@ Requirements:
     - numpy
     - pillow
 """
+import os
+
+# Requests already run in parallel on the router's thread pool, so keep the
+# BLAS/OpenMP libraries under dlib and numpy single-threaded per request to
+# avoid oversubscribing the cores. Must be set before they are imported.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+import dlib
 import face_recognition
 import cv2
 import numpy as np
-from PIL import Image
-from io import BytesIO
 import base64
 import json
+import math
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Tuple, List, Dict
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional - fall back to the NumPy einsum path
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib json module
+    orjson = None
+
+try:
+    import hnswlib
+except ImportError:  # hnswlib is optional - verify falls back to the linear scan
+    hnswlib = None
+
 
 # ============================================================================
 # REQUEST/RESPONSE MODELS
@@ -64,8 +90,79 @@ class UserListResponse(BaseModel):
 # CONFIGURATION
 # ============================================================================
 
-ENROLLED_USERS_FILE = "enrolled_users_encodings.json"
+ENROLLED_USERS_FILE = "enrolled_users_encodings.json"  # Names and enrollment metadata
+ENCODINGS_FILE = "enrolled_users_encodings.npy"  # (N, 128) float32 encoding matrix
+INDEX_FILE = "enrolled_users_encodings.hnsw"  # HNSW index over the matrix rows (labels = rows)
 FACE_MATCH_THRESHOLD = 0.6  # Lower is more strict (face_recognition default)
+FACE_MATCH_THRESHOLD_SQ = FACE_MATCH_THRESHOLD ** 2  # Compared against squared distances
+ENCODING_DIM = 128  # face_recognition encoding length
+GEMV_MIN_USERS = 64  # Below this, broadcast-subtract beats the norm expansion
+# The numba scan stops early on a distance below this fraction of the threshold;
+# the margin keeps a merely-passing row from beating a closer one further on
+EARLY_ACCEPT_RATIO = 0.8
+HNSW_MIN_USERS = 1000  # Enrolment size at which verify switches to an HNSW index
+DETECT_MAX_SIDE = 640  # Detection runs on a copy downscaled to this long edge
+
+# Optional YuNet ONNX face detector (OpenCV model zoo), run through OpenCV's DNN
+# module instead of dlib HOG. Set FACE_DETECTOR=hog to force the HOG path.
+YUNET_MODEL = Path(os.getenv(
+    "YUNET_MODEL_PATH",
+    Path(__file__).parent.parent / "face_detection_yunet_2023mar.onnx"
+))
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "yunet").lower()
+
+# Set FACE_DEBUG=1 to log the distance to every enrolled user on each login
+FACE_DEBUG = os.getenv("FACE_DEBUG", "").lower() in ("1", "true", "yes")
+
+
+if njit is not None:
+    # Eagerly compiled for the one signature used, so there is no JIT pause
+    # on the first login. int8 rows quarter the bytes scanned per user, and
+    # the fixed inner trip count lets LLVM vectorize the int8 -> int32
+    # multiply-accumulate (pmaddwd / VNNI where available)
+    @njit("void(int8[:, ::1], int8[::1], int32[::1])",
+          fastmath=True, cache=True, parallel=True)
+    def _batch_sqdist_128(matrix, query, out):
+        """Squared Euclidean distance from query to each row of matrix (int8 units)."""
+        for i in prange(matrix.shape[0]):
+            total = np.int32(0)
+            for k in range(ENCODING_DIM):
+                d = np.int32(matrix[i, k]) - np.int32(query[k])
+                total += d * d
+            out[i] = total
+    
+    @njit("UniTuple(int64, 2)(int8[:, ::1], int8[::1], int64)",
+          fastmath=True, cache=True)
+    def _find_match_128(matrix, query, accept):
+        """
+        Scan rows in order and stop at the first squared distance below
+        accept; otherwise return the nearest row. Returns (index, sq distance).
+        """
+        best_idx = -1
+        best = np.int64(1) << 62
+        for i in range(matrix.shape[0]):
+            total = np.int64(0)
+            for k in range(ENCODING_DIM):
+                d = np.int64(matrix[i, k]) - np.int64(query[k])
+                total += d * d
+            if total < best:
+                best = total
+                best_idx = i
+                if total < accept:
+                    break
+        return best_idx, best
+else:
+    _batch_sqdist_128 = None
+    _find_match_128 = None
+
+
+def _aligned_copy(array: np.ndarray, align: int = 64) -> np.ndarray:
+    """Copy array into a C-contiguous buffer whose start is align-byte aligned."""
+    buffer = np.empty(array.nbytes + align, dtype=np.uint8)
+    offset = -buffer.ctypes.data % align
+    aligned = buffer[offset:offset + array.nbytes].view(array.dtype).reshape(array.shape)
+    aligned[...] = array
+    return aligned
 
 
 # ============================================================================
@@ -80,56 +177,276 @@ class ProductionFaceRecognizer:
         - Face detection with dlib HOG or CNN detector
         - 128-dimensional face encoding extraction
         - Face matching using euclidean distance
-        - JSON storage for encodings (no image files)
+        - .npy matrix storage for encodings, JSON for names (no image files)
     """
     
     def __init__(self):
         """Initialize the face recognizer."""
         self.gateway_root = Path(__file__).parent.parent
         self.users_file_path = self.gateway_root / ENROLLED_USERS_FILE
-        self.enrolled_users = self._load_users()
+        self.encodings_file_path = self.gateway_root / ENCODINGS_FILE
+        self.index_file_path = self.gateway_root / INDEX_FILE
+        # Guards enrolled_users/_user_ids/_enc_matrix: requests run on worker threads
+        self._lock = threading.Lock()
+        self._load_users()
+        self._yunet = self._load_yunet()
+        self._yunet_lock = threading.Lock()  # setInputSize + detect must not interleave
         
         print("=" * 60)
         print("🤖 Production Face Recognition System Initialized")
         print("=" * 60)
         print(f"✓ Using face_recognition library v{face_recognition.__version__}")
         print(f"✓ Using OpenCV v{cv2.__version__}")
+        print(f"✓ dlib v{dlib.__version__} encoder backend: {'CUDA' if dlib.DLIB_USE_CUDA else 'CPU'}")
+        print(f"✓ Face detector: {'YuNet (' + YUNET_MODEL.name + ')' if self._yunet else 'dlib HOG'}")
         print(f"✓ Enrolled users file: {self.users_file_path}")
         print(f"✓ Loaded {len(self.enrolled_users)} enrolled users")
         print(f"✓ Face match threshold: {FACE_MATCH_THRESHOLD}")
         print("=" * 60)
     
-    def _load_users(self) -> Dict[str, Dict]:
+    def _load_users(self) -> None:
         """
-        Load enrolled users from JSON file.
+        Load enrolled users: metadata from the JSON file and encodings from
+        the .npy matrix, whose rows follow each user's 'row' index.
         
-        Returns:
-            Dict mapping user_id to user data (name and encoding)
-        """
-        if self.users_file_path.exists():
-            with open(self.users_file_path, 'r') as f:
-                users_data = json.load(f)
-                # Convert encoding lists back to numpy arrays
-                for user_id in users_data:
-                    users_data[user_id]['encoding'] = np.array(
-                        users_data[user_id]['encoding']
-                    )
-                return users_data
-        return {}
+        Sets enrolled_users (user_id -> name/enrolled_at), plus the
+        contiguous (N, 128) float32 _enc_matrix (with its int8 copy) and
+        parallel _user_ids list that verification runs against.
+        """
+        self.enrolled_users = {}
+        self._user_ids = []
+        self._enc_matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._index = None
+        self._refresh_matrix_caches()
+        
+        if not self.users_file_path.exists():
+            return
+        
+        raw = self.users_file_path.read_bytes()
+        users_data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        
+        has_rows = bool(users_data) and all('row' in data for data in users_data.values())
+        if has_rows and not self.encodings_file_path.exists():
+            # Current format but the matrix is gone - the metadata alone can't
+            # verify anyone, so start with an empty enrolment rather than crash
+            print(f"WARNING: {self.encodings_file_path.name} is missing - starting with no enrolled users")
+            return
+        
+        if has_rows:
+            matrix = np.load(self.encodings_file_path)
+            # The matrix, index and JSON are replaced one after another, and a
+            # delete moves the last row into the freed slot - after an
+            # interrupted save the 'row' values would point at other people's
+            # encodings, so only accept rows that are exactly 0..N-1 for this matrix
+            rows = sorted(data['row'] for data in users_data.values())
+            if matrix.ndim != 2 or matrix.shape[1] != ENCODING_DIM \
+                    or rows != list(range(matrix.shape[0])):
+                print(f"ERROR: {self.encodings_file_path.name} (shape {matrix.shape}) does not match "
+                      f"the {len(rows)} users in {self.users_file_path.name} - the files are out of "
+                      f"sync (interrupted save?). Starting with no enrolled users; please re-enroll.")
+                return
+            
+            self._user_ids = sorted(users_data, key=lambda user_id: users_data[user_id]['row'])
+            self._enc_matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+            for data in users_data.values():
+                del data['row']
+            self.enrolled_users = users_data
+        else:
+            # Older files stored each encoding inline as a JSON list - migrate them
+            self._user_ids = list(users_data.keys())
+            if self._user_ids:
+                self._enc_matrix = np.array(
+                    [users_data[user_id].pop('encoding') for user_id in self._user_ids],
+                    dtype=np.float32
+                )
+            self.enrolled_users = users_data
+            if users_data:
+                self._save_users()
+        self._refresh_matrix_caches()
+        self._load_index()
+    
+    def _refresh_matrix_caches(self) -> None:
+        """
+        Refresh the data derived from the encoding matrix after it changes:
+        the symmetric int8 copy used by the numba distance kernel (one scale
+        for the whole matrix, so distances stay comparable across users)
+        and the per-row squared norms used by the NumPy GEMV path.
+        """
+        # 128 float32 (512 B) / int8 (128 B) rows are whole cache lines, so
+        # aligning the base keeps every row on line boundaries
+        self._enc_matrix = _aligned_copy(self._enc_matrix)
+        self._enc_sq_norms = np.einsum('ij,ij->i', self._enc_matrix, self._enc_matrix)
+        max_abs = float(np.abs(self._enc_matrix).max()) if len(self._enc_matrix) else 0.0
+        self._q_scale = 127.0 / max(max_abs, 1e-6)
+        self._enc_q = _aligned_copy(self._quantise(self._enc_matrix))
+    
+    def _build_index(self):
+        """Build an L2 HNSW index over the encodings for large enrolments."""
+        count = len(self._enc_matrix)
+        if hnswlib is None or count < HNSW_MIN_USERS:
+            return None
+        index = hnswlib.Index(space='l2', dim=ENCODING_DIM)
+        index.init_index(max_elements=count, ef_construction=200, M=16)
+        index.add_items(self._enc_matrix, np.arange(count))
+        index.set_ef(50)
+        print(f"✓ Built HNSW index over {count} enrolled users")
+        return index
+    
+    def _load_index(self) -> None:
+        """
+        Load the saved HNSW index, or build (and save) a fresh one when it is
+        missing, unreadable or older than the encoding matrix.
+        """
+        self._index = None
+        if hnswlib is None or len(self._enc_matrix) < HNSW_MIN_USERS:
+            return
+        index_path = self.index_file_path
+        if index_path.exists() and \
+                index_path.stat().st_mtime_ns >= self.encodings_file_path.stat().st_mtime_ns:
+            try:
+                index = hnswlib.Index(space='l2', dim=ENCODING_DIM)
+                index.load_index(str(index_path), max_elements=len(self._enc_matrix))
+                index.set_ef(50)
+                self._index = index
+                print(f"✓ Loaded HNSW index from {index_path.name}")
+                return
+            except Exception as e:
+                print(f"WARNING: Ignoring unreadable HNSW index: {e}")
+        self._index = self._build_index()
+        self._save_index()
+    
+    def _update_index(self, row: int) -> None:
+        """Insert or replace one matrix row in the HNSW index (built once large enough)."""
+        if self._index is None:
+            self._index = self._build_index()
+            return
+        if self._index.get_current_count() >= self._index.get_max_elements():
+            self._index.resize_index(2 * self._index.get_max_elements())
+        # Re-adding an existing (or deleted) label updates it in place
+        self._index.add_items(self._enc_matrix[row:row + 1], np.array([row]))
+    
+    def _save_index(self) -> None:
+        """Save the HNSW index next to the encoding matrix (or remove a stale one)."""
+        if self._index is not None:
+            tmp_path = self.index_file_path.with_suffix('.hnsw.tmp')
+            self._index.save_index(str(tmp_path))
+            os.replace(tmp_path, self.index_file_path)
+        elif self.index_file_path.exists():
+            self.index_file_path.unlink()
+    
+    def _quantise(self, values: np.ndarray) -> np.ndarray:
+        """Quantise encodings to int8 with the current matrix scale."""
+        return np.ascontiguousarray(
+            np.clip(np.round(values * self._q_scale), -127, 127), dtype=np.int8
+        )
+    
+    def _append_encoding(self, user_id: str, encoding: np.ndarray) -> None:
+        """Add a newly enrolled user's encoding to the matrix."""
+        row = np.asarray(encoding, dtype=np.float32)[np.newaxis, :]
+        self._enc_matrix = np.vstack([self._enc_matrix, row])
+        self._user_ids.append(user_id)
+        self._refresh_matrix_caches()
+        self._update_index(len(self._user_ids) - 1)
+    
+    def _remove_encoding(self, user_id: str) -> None:
+        """
+        Drop a deleted user's encoding from the matrix by moving the last row
+        into its place, so the HNSW labels of every other row stay valid.
+        """
+        row = self._user_ids.index(user_id)
+        last = len(self._user_ids) - 1
+        matrix = self._enc_matrix.copy()
+        if row != last:
+            matrix[row] = matrix[last]
+            self._user_ids[row] = self._user_ids[last]
+        self._enc_matrix = matrix[:last]
+        self._user_ids.pop()
+        self._refresh_matrix_caches()
+        
+        if self._index is None:
+            return
+        if len(self._user_ids) < HNSW_MIN_USERS:
+            self._index = None
+            return
+        if row != last:
+            self._update_index(row)
+        self._index.mark_deleted(last)
+    
+    def _squared_distances(self, encoding: np.ndarray) -> np.ndarray:
+        """Squared Euclidean distance from an encoding to every enrolled user."""
+        query = np.ascontiguousarray(encoding, dtype=np.float32)
+        if _batch_sqdist_128 is not None:
+            # The kernel's inner loop is fixed at ENCODING_DIM and does no bounds checks
+            if self._enc_q.shape[1] != ENCODING_DIM or query.shape != (ENCODING_DIM,):
+                raise ValueError(
+                    f"Expected {ENCODING_DIM}-d encodings, got matrix {self._enc_q.shape} "
+                    f"and query {query.shape}"
+                )
+            out = np.empty(len(self._user_ids), dtype=np.int32)
+            _batch_sqdist_128(self._enc_q, self._quantise(query), out)
+            return out.astype(np.float32) / (self._q_scale * self._q_scale)
+        if len(self._user_ids) >= GEMV_MIN_USERS:
+            # ||e - q||^2 = ||e||^2 + ||q||^2 - 2 e.q : one BLAS sgemv with the
+            # cached row norms instead of materialising an (N, 128) difference
+            sq = self._enc_sq_norms + float(query @ query) - 2.0 * (self._enc_matrix @ query)
+            return np.maximum(sq, 0.0, out=sq)
+        diff = self._enc_matrix - query
+        return np.einsum('ij,ij->i', diff, diff)
+    
+    def _find_match(self, encoding: np.ndarray) -> Tuple[int, float]:
+        """
+        Index and squared distance of the first enrolled user well inside
+        the threshold, or of the nearest user if none is (numba path only).
+        """
+        query = self._quantise(np.asarray(encoding, dtype=np.float32))
+        scale_sq = self._q_scale * self._q_scale
+        accept = int(EARLY_ACCEPT_RATIO * FACE_MATCH_THRESHOLD_SQ * scale_sq)
+        best_idx, best_sq = _find_match_128(self._enc_q, query, accept)
+        return int(best_idx), best_sq / scale_sq
     
     def _save_users(self) -> None:
-        """Save enrolled users to JSON file."""
-        # Convert numpy arrays to lists for JSON serialization
+        """Save the encoding matrix to .npy and user metadata to JSON."""
+        # Write the matrix to a temp file and swap it in atomically
+        tmp_path = self.encodings_file_path.with_suffix('.npy.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self._enc_matrix)
+        os.replace(tmp_path, self.encodings_file_path)
+        self._save_index()
+        
         users_data = {}
-        for user_id, data in self.enrolled_users.items():
+        for row, user_id in enumerate(self._user_ids):
+            data = self.enrolled_users[user_id]
             users_data[user_id] = {
                 'name': data['name'],
-                'encoding': data['encoding'].tolist(),
-                'enrolled_at': data.get('enrolled_at', '')
+                'enrolled_at': data.get('enrolled_at', ''),
+                'row': row
             }
         
-        with open(self.users_file_path, 'w') as f:
-            json.dump(users_data, f, indent=2)
+        # Same temp-file swap for the metadata, so it is never half-written
+        tmp_path = self.users_file_path.with_suffix('.json.tmp')
+        if orjson is not None:
+            tmp_path.write_bytes(orjson.dumps(users_data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_path, 'w') as f:
+                json.dump(users_data, f, indent=2)
+        os.replace(tmp_path, self.users_file_path)
+    
+    def _load_yunet(self):
+        """Create the YuNet detector if it is enabled and its model file exists."""
+        if FACE_DETECTOR != "yunet" or not YUNET_MODEL.exists() \
+                or not hasattr(cv2, 'FaceDetectorYN_create'):
+            return None
+        return cv2.FaceDetectorYN_create(str(YUNET_MODEL), "", (320, 320))
+    
+    def warm_up(self) -> None:
+        """
+        Run one dummy detection and encoding so dlib's detector, shape
+        predictor and ResNet weights are loaded before the first request.
+        """
+        blank = np.zeros((100, 100, 3), dtype=np.uint8)
+        face_recognition.face_locations(blank, model="hog")
+        face_recognition.face_encodings(blank, [(0, 100, 100, 0)])
+        print("✓ Face recognition models warmed up")
     
     def get_enrolled_users(self) -> List[Dict[str, str]]:
         """Get list of all enrolled users (without encodings)."""
@@ -152,17 +469,26 @@ class ProductionFaceRecognizer:
         Returns:
             numpy array in RGB format (face_recognition uses RGB)
         """
-        image_data = base64.b64decode(base64_image)
-        image = Image.open(BytesIO(image_data))
-        
-        # Convert to RGB (face_recognition requires RGB)
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        return self._decode_bytes(base64.b64decode(base64_image))
+    
+    def _decode_bytes(self, image_data: bytes) -> np.ndarray:
+        """
+        Decode raw image file bytes (JPEG/PNG) to numpy array in RGB format.
         
-        # Convert PIL Image to numpy array
-        image_np = np.array(image)
+        Args:
+            image_data: Encoded image file contents
+            
+        Returns:
+            numpy array in RGB format (face_recognition uses RGB)
+        """
+        # Decode with OpenCV (libjpeg-turbo, SIMD IDCT); IMREAD_COLOR always
+        # yields 3-channel BGR, dropping alpha / expanding grayscale
+        image_bgr = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if image_bgr is None:
+            raise ValueError("Could not decode image data")
         
-        return image_np
+        # Convert to RGB (face_recognition requires RGB)
+        return cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
     
     def detect_faces(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
@@ -174,32 +500,71 @@ class ProductionFaceRecognizer:
         Returns:
             List of face locations as (top, right, bottom, left) tuples
         """
-        face_locations = face_recognition.face_locations(
-            image,
-            model="hog"  # Use "cnn" for better accuracy but slower (requires GPU)
-        )
+        # Detector cost scales with pixel count and a login face fills the frame,
+        # so detect on a downscaled copy and map boxes back to full resolution
+        scale = min(1.0, DETECT_MAX_SIDE / max(image.shape[:2]))
+        small = image
+        if scale < 1.0:
+            small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        if self._yunet is not None:
+            face_locations = self._detect_yunet(small)
+        else:
+            face_locations = face_recognition.face_locations(
+                small,
+                model="hog"  # Use "cnn" for better accuracy but slower (requires GPU)
+            )
+        if scale < 1.0:
+            face_locations = [
+                tuple(int(round(v / scale)) for v in location)
+                for location in face_locations
+            ]
         return face_locations
     
-    def extract_encoding(self, image: np.ndarray, face_location: Tuple = None) -> Optional[np.ndarray]:
+    def _detect_yunet(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
-        Extract 128-dimensional face encoding from image.
+        Detect faces with YuNet.
         
         Args:
             image: numpy array in RGB format
-            face_location: Optional pre-detected face location
             
         Returns:
-            128-d numpy array encoding, or None if no face found
+            List of face locations as (top, right, bottom, left) tuples
         """
-        if face_location:
-            # Use provided face location
-            encodings = face_recognition.face_encodings(image, [face_location])
-        else:
-            # Detect face automatically
-            encodings = face_recognition.face_encodings(image)
+        height, width = image.shape[:2]
+        bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        with self._yunet_lock:
+            self._yunet.setInputSize((width, height))
+            _, detections = self._yunet.detect(bgr)
+        if detections is None:
+            return []
+        
+        face_locations = []
+        for x, y, w, h in detections[:, :4]:
+            top = max(0, int(y))
+            left = max(0, int(x))
+            bottom = min(height, int(y + h))
+            right = min(width, int(x + w))
+            face_locations.append((top, right, bottom, left))
+        return face_locations
+    
+    def extract_encoding(self, image: np.ndarray, face_location: Tuple) -> Optional[np.ndarray]:
+        """
+        Extract 128-dimensional face encoding from image.
+        
+        Args:
+            image: numpy array in RGB format (the same array passed to detect_faces)
+            face_location: Face location from detect_faces - detection is not re-run
+            
+        Returns:
+            128-d float32 numpy array encoding, or None if no face found
+        """
+        encodings = face_recognition.face_encodings(image, [face_location])
         
         if len(encodings) > 0:
-            return encodings[0]
+            # float64 precision is meaningless at a 0.6 match threshold;
+            # float32 halves the memory moved per distance computation
+            return encodings[0].astype(np.float32, copy=False)
         return None
     
     def enroll_user(self, user_id: str, name: str, base64_image: str) -> Tuple[bool, Optional[str]]:
@@ -240,14 +605,20 @@ class ProductionFaceRecognizer:
             
             # Store user data with encoding
             from datetime import datetime
-            self.enrolled_users[user_id] = {
-                'name': name,
-                'encoding': encoding,
-                'enrolled_at': datetime.now().isoformat()
-            }
-            
-            # Save to file
-            self._save_users()
+            with self._lock:
+                # Re-check: another request may have enrolled this ID meanwhile
+                if user_id in self.enrolled_users:
+                    return False, f"User '{user_id}' is already enrolled. Delete first to re-enroll."
+                
+                self.enrolled_users[user_id] = {
+                    'name': name,
+                    'enrolled_at': datetime.now().isoformat()
+                }
+                
+                self._append_encoding(user_id, encoding)
+                
+                # Save to file
+                self._save_users()
             
             print(f"✓ User enrolled: {user_id} ({name})")
             print(f"  - Face location: {face_location}")
@@ -270,12 +641,14 @@ class ProductionFaceRecognizer:
             Tuple of (success: bool, message: Optional[str])
         """
         try:
-            if user_id not in self.enrolled_users:
-                return False, f"User '{user_id}' not found."
-            
-            user_name = self.enrolled_users[user_id]["name"]
-            del self.enrolled_users[user_id]
-            self._save_users()
+            with self._lock:
+                if user_id not in self.enrolled_users:
+                    return False, f"User '{user_id}' not found."
+                
+                user_name = self.enrolled_users[user_id]["name"]
+                del self.enrolled_users[user_id]
+                self._remove_encoding(user_id)
+                self._save_users()
             
             print(f"✓ User deleted: {user_id} ({user_name})")
             return True, f"User '{user_name}' deleted successfully!"
@@ -291,6 +664,23 @@ class ProductionFaceRecognizer:
         Args:
             base64_image: Base64 encoded image string
             
+        Returns:
+            Tuple of (success: bool, message: Optional[str], user_id: Optional[str], confidence: Optional[float])
+        """
+        try:
+            image_data = base64.b64decode(base64_image)
+        except Exception as e:
+            print(f"ERROR in face verification: {e}")
+            return False, f"Error processing image: {str(e)}", None, None
+        return self.verify_face_bytes(image_data)
+    
+    def verify_face_bytes(self, image_data: bytes) -> Tuple[bool, Optional[str], Optional[str], Optional[float]]:
+        """
+        Verify face against enrolled users from raw image file bytes.
+        
+        Args:
+            image_data: Encoded image file contents (JPEG/PNG)
+            
         Returns:
             Tuple of (success: bool, message: Optional[str], user_id: Optional[str], confidence: Optional[float])
         """
@@ -300,7 +690,7 @@ class ProductionFaceRecognizer:
                 return False, "No users enrolled. Please enroll first.", None, None
             
             # Decode image
-            image = self._decode_image(base64_image)
+            image = self._decode_bytes(image_data)
             
             # Detect faces
             face_locations = self.detect_faces(image)
@@ -319,48 +709,52 @@ class ProductionFaceRecognizer:
                 return False, "Failed to extract face encoding. Please try again.", None, None
             
             # Compare against all enrolled users
-            best_match_user_id = None
-            best_distance = float('inf')
-            
-            print("\n" + "=" * 60)
-            print("🔍 Face Verification Results")
-            print("=" * 60)
-            
-            enrolled_encodings = []
-            user_ids_list = []
-            
-            for user_id, user_data in self.enrolled_users.items():
-                enrolled_encodings.append(user_data['encoding'])
-                user_ids_list.append(user_id)
-            
-            # Compute face distances (Euclidean distance in 128-d space)
-            face_distances = face_recognition.face_distance(
-                enrolled_encodings,
-                captured_encoding
-            )
-            
-            # Find best match
-            for i, (user_id, distance) in enumerate(zip(user_ids_list, face_distances)):
-                user_name = self.enrolled_users[user_id]['name']
-                confidence = max(0, (1 - distance) * 100)  # Convert distance to confidence %
+            # Squared Euclidean distances in 128-d space against the enrolled
+            # matrix; argmin and the threshold test don't need the sqrt
+            with self._lock:
+                user_ids = list(self._user_ids)
+                if self._index is not None and not FACE_DEBUG:
+                    # Approximate nearest neighbour; hnswlib 'l2' returns squared distance
+                    labels, distances = self._index.knn_query(
+                        np.asarray(captured_encoding, dtype=np.float32), k=1
+                    )
+                    best_idx, best_sq_distance = int(labels[0][0]), float(distances[0][0])
+                elif _find_match_128 is not None and not FACE_DEBUG:
+                    # Early-exit scan; per-user distances aren't needed
+                    best_idx, best_sq_distance = self._find_match(captured_encoding)
+                else:
+                    sq_distances = self._squared_distances(captured_encoding)
+                    best_idx = int(sq_distances.argmin())
+                    best_sq_distance = float(sq_distances[best_idx])
+                best_match_user_id = user_ids[best_idx]
+                best_user_name = self.enrolled_users[best_match_user_id]['name']
+                if FACE_DEBUG:
+                    user_names = [self.enrolled_users[user_id]['name'] for user_id in user_ids]
+            
+            best_distance = math.sqrt(best_sq_distance)
+            
+            if FACE_DEBUG:
+                print("\n" + "=" * 60)
+                print("🔍 Face Verification Results")
+                print("=" * 60)
                 
-                print(f"   {user_name} ({user_id}):")
-                print(f"      Distance: {distance:.4f}")
-                print(f"      Confidence: {confidence:.1f}%")
-                print(f"      Match: {'✓ YES' if distance < FACE_MATCH_THRESHOLD else '✗ NO'}")
+                for user_id, user_name, distance in zip(user_ids, user_names, np.sqrt(sq_distances)):
+                    confidence = max(0, (1 - distance) * 100)  # Convert distance to confidence %
+                    
+                    print(f"   {user_name} ({user_id}):")
+                    print(f"      Distance: {distance:.4f}")
+                    print(f"      Confidence: {confidence:.1f}%")
+                    print(f"      Match: {'✓ YES' if distance < FACE_MATCH_THRESHOLD else '✗ NO'}")
                 
-                if distance < best_distance:
-                    best_distance = distance
-                    best_match_user_id = user_id
+                print("=" * 60)
             
-            print("=" * 60)
-            print(f"🎯 Best Match: {best_distance:.4f}")
-            print(f"🎚️  Threshold: {FACE_MATCH_THRESHOLD:.2f}")
-            print("=" * 60 + "\n")
+            print(f"🎯 Face verification: best match {best_user_name} ({best_match_user_id}) "
+                  f"distance {best_distance:.4f}, threshold {FACE_MATCH_THRESHOLD:.2f}, "
+                  f"{len(user_ids)} enrolled")
             
             # Check if best match meets threshold
-            if best_distance < FACE_MATCH_THRESHOLD and best_match_user_id:
-                user_name = self.enrolled_users[best_match_user_id]["name"]
+            if best_sq_distance < FACE_MATCH_THRESHOLD_SQ and best_match_user_id:
+                user_name = best_user_name
                 confidence = max(0, (1 - best_distance) * 100)
                 
                 return (
@@ -387,6 +781,11 @@ class ProductionFaceRecognizer:
 
 # Initialize the face recognizer (singleton)
 face_recognizer = ProductionFaceRecognizer()
+face_recognizer.warm_up()
+
+# dlib releases the GIL during detection/encoding, so concurrent requests
+# run in parallel here instead of blocking the event loop
+executor = ThreadPoolExecutor(max_workers=os.cpu_count())
 
 
 # ============================================================================
@@ -411,7 +810,9 @@ def create_auth_router() -> APIRouter:
         Returns:
             EnrollUserResponse with success status and message
         """
-        success, message = face_recognizer.enroll_user(
+        success, message = await asyncio.get_running_loop().run_in_executor(
+            executor,
+            face_recognizer.enroll_user,
             request.user_id,
             request.name,
             request.image
@@ -440,7 +841,9 @@ def create_auth_router() -> APIRouter:
         Returns:
             Response with success status and message
         """
-        success, message = face_recognizer.delete_user(user_id)
+        success, message = await asyncio.get_running_loop().run_in_executor(
+            executor, face_recognizer.delete_user, user_id
+        )
         
         return {
             "success": success,
@@ -475,8 +878,32 @@ def create_auth_router() -> APIRouter:
         Returns:
             FaceLoginResponse with success status, user info, and confidence
         """
-        success, message, user_id, confidence = face_recognizer.verify_face(request.image)
+        result = await asyncio.get_running_loop().run_in_executor(
+            executor, face_recognizer.verify_face, request.image
+        )
+        return _login_response(*result)
+    
+    @router.post("/face-login/upload", response_model=FaceLoginResponse)
+    async def face_login_upload(image: UploadFile = File(...)) -> FaceLoginResponse:
+        """
+        Authenticate user via face recognition from a multipart image upload.
+        
+        Same as /face-login but skips the base64 encoding of the image.
         
+        Args:
+            image: Uploaded image file
+            
+        Returns:
+            FaceLoginResponse with success status, user info, and confidence
+        """
+        image_bytes = await image.read()
+        result = await asyncio.get_running_loop().run_in_executor(
+            executor, face_recognizer.verify_face_bytes, image_bytes
+        )
+        return _login_response(*result)
+    
+    def _login_response(success, message, user_id, confidence) -> FaceLoginResponse:
+        """Build the face login response from a verification result."""
         if success:
             user_name = face_recognizer.enrolled_users[user_id]["name"] if user_id else "Unknown"
             return FaceLoginResponse(
@@ -8,15 +8,26 @@ For production, replace with full face_recognition implementation.
 """
 from PIL import Image
 from io import BytesIO
+import numpy as np
 import base64
 import os
 import json
 from pathlib import Path
 from typing import Optional, Tuple, List, Dict
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional - fall back to the NumPy broadcast
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib json module
+    orjson = None
+
 
 # Request/Response Models
 class FaceLoginRequest(BaseModel):
@@ -54,6 +65,32 @@ class UserListResponse(BaseModel):
 ENROLLED_USERS_DIR = "enrolled_users"
 USERS_INDEX_FILE = "users.json"
 DEMO_MODE = True  # Set to False when face_recognition is available
+COMPARE_SIZE = (200, 200)  # Images are resized to this before comparison
+DRAFT_SIZE = (400, 400)  # JPEGs are decoded at a reduced scale no smaller than this
+
+# Set FACE_DEBUG=1 to log the similarity to every enrolled user on each login
+FACE_DEBUG = os.getenv("FACE_DEBUG", "").lower() in ("1", "true", "yes")
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _score_kernel(enrolled_pixels, enrolled_hists, pixels, hist, out):
+        """Write the 0-100 similarity of pixels/hist against each enrolled row into out"""
+        n_pixels = pixels.shape[0]
+        # Every pixel lands in one bin per channel, so each histogram sums to this
+        channel_pixels = n_pixels // 3
+        for u in prange(enrolled_pixels.shape[0]):
+            pixel_diff = 0
+            for k in range(n_pixels):
+                pixel_diff += abs(enrolled_pixels[u, k] - pixels[k])
+            correlation = 0
+            for k in range(hist.shape[0]):
+                correlation += enrolled_hists[u, k] * hist[k]
+            histogram_similarity = correlation / 3.0 / (channel_pixels * channel_pixels)
+            pixel_similarity = 1.0 - pixel_diff / n_pixels / 255.0
+            out[u] = ((histogram_similarity * 0.4) + (pixel_similarity * 0.6)) * 100
+else:
+    _score_kernel = None
 
 
 class SimpleFaceAuthenticator:
@@ -66,6 +103,22 @@ class SimpleFaceAuthenticator:
         self.users_index_path = self.enrolled_users_dir / USERS_INDEX_FILE
         self._setup_directories()
         self.enrolled_users = self._load_users_index()
+        # get_enrolled_users() result, rebuilt lazily after enroll/delete
+        self._users_list_cache: Optional[List[Dict[str, str]]] = None
+        
+        # Comparison tensors of the enrolled images, decoded once instead of
+        # on every login: (N, 200, 200, 3) int16 pixels, (N, 3, 256) int32 histograms
+        self._enrolled_ids: List[str] = []
+        self._enrolled_pixels = np.empty((0, COMPARE_SIZE[1], COMPARE_SIZE[0], 3), dtype=np.int16)
+        self._enrolled_hists = np.empty((0, 3, 256), dtype=np.int32)
+        self._load_enrolled_tensors()
+        
+        if _score_kernel is not None:
+            # Compile (or load the cached) kernel now so the first login isn't slow
+            _score_kernel(
+                np.zeros((1, 3), dtype=np.int16), np.zeros((1, 3), dtype=np.int32),
+                np.zeros(3, dtype=np.int16), np.zeros(3, dtype=np.int32), np.zeros(1)
+            )
     
     def _setup_directories(self) -> None:
         """Create enrolled users directory if it doesn't exist."""
@@ -75,23 +128,54 @@ class SimpleFaceAuthenticator:
     def _load_users_index(self) -> Dict[str, Dict[str, str]]:
         """Load the users index from JSON file."""
         if self.users_index_path.exists():
-            with open(self.users_index_path, 'r') as f:
-                users = json.load(f)
-                print(f"✓ Loaded {len(users)} enrolled users")
-                return users
+            if orjson is not None:
+                users = orjson.loads(self.users_index_path.read_bytes())
+            else:
+                with open(self.users_index_path, 'r') as f:
+                    users = json.load(f)
+            print(f"✓ Loaded {len(users)} enrolled users")
+            return users
         return {}
     
     def _save_users_index(self) -> None:
         """Save the users index to JSON file."""
-        with open(self.users_index_path, 'w') as f:
-            json.dump(self.enrolled_users, f, indent=2)
+        # Write to a temp file and swap it in so a crash mid-write cannot
+        # leave a truncated index behind
+        tmp_path = self.users_index_path.with_suffix('.json.tmp')
+        if orjson is not None:
+            tmp_path.write_bytes(orjson.dumps(self.enrolled_users, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.enrolled_users, f, indent=2)
+        os.replace(tmp_path, self.users_index_path)
+    
+    def _load_enrolled_tensors(self) -> None:
+        """Decode every enrolled image once and cache its comparison tensors."""
+        ids, pixels, hists = [], [], []
+        for user_id, user_data in self.enrolled_users.items():
+            image_path = self.enrolled_users_dir / user_data["image_file"]
+            if not image_path.exists():
+                print(f"⚠️  Enrolled image not found for {user_id}")
+                continue
+            
+            user_pixels, user_hist = self._file_tensors(image_path)
+            ids.append(user_id)
+            pixels.append(user_pixels)
+            hists.append(user_hist)
+        
+        if ids:
+            self._enrolled_ids = ids
+            self._enrolled_pixels = np.stack(pixels)
+            self._enrolled_hists = np.stack(hists)
     
     def get_enrolled_users(self) -> List[Dict[str, str]]:
         """Get list of all enrolled users."""
-        return [
-            {"user_id": user_id, "name": user_data["name"]}
-            for user_id, user_data in self.enrolled_users.items()
-        ]
+        if self._users_list_cache is None:
+            self._users_list_cache = [
+                {"user_id": user_id, "name": user_data["name"]}
+                for user_id, user_data in self.enrolled_users.items()
+            ]
+        return self._users_list_cache
     
     def is_user_enrolled(self, user_id: str) -> bool:
         """Check if a user is enrolled."""
@@ -132,6 +216,14 @@ class SimpleFaceAuthenticator:
             
             image.save(image_path, 'JPEG', quality=90)
             
+            # Cache the comparison tensors so logins never re-decode the file.
+            # Built from the saved JPEG (not the upload) so they match what
+            # _load_enrolled_tensors produces after a restart
+            user_pixels, user_hist = self._file_tensors(image_path)
+            self._enrolled_ids.append(user_id)
+            self._enrolled_pixels = np.concatenate((self._enrolled_pixels, user_pixels[None]))
+            self._enrolled_hists = np.concatenate((self._enrolled_hists, user_hist[None]))
+            
             # Add to users index
             self.enrolled_users[user_id] = {
                 "name": name,
@@ -139,6 +231,7 @@ class SimpleFaceAuthenticator:
                 "enrolled_at": str(Path(image_path).stat().st_mtime)
             }
             self._save_users_index()
+            self._users_list_cache = None
             
             print(f"✓ User enrolled: {user_id} ({name})")
             return True, f"User '{name}' enrolled successfully!"
@@ -172,7 +265,14 @@ class SimpleFaceAuthenticator:
             
             # Remove from users index
             del self.enrolled_users[user_id]
+            
+            if user_id in self._enrolled_ids:
+                row = self._enrolled_ids.index(user_id)
+                del self._enrolled_ids[row]
+                self._enrolled_pixels = np.delete(self._enrolled_pixels, row, axis=0)
+                self._enrolled_hists = np.delete(self._enrolled_hists, row, axis=0)
             self._save_users_index()
+            self._users_list_cache = None
             
             print(f"✓ User deleted: {user_id} ({user_name})")
             return True, f"User '{user_name}' deleted successfully!"
@@ -181,108 +281,104 @@ class SimpleFaceAuthenticator:
             print(f"ERROR deleting user: {e}")
             return False, f"Error deleting user: {str(e)}"
     
-    def _compare_images(self, image1: Image.Image, image2: Image.Image) -> float:
+    def _file_tensors(self, image_path: Path) -> Tuple[np.ndarray, np.ndarray]:
+        """Comparison tensors for a saved enrolment JPEG (see _image_tensors)."""
+        with Image.open(image_path) as image:
+            # The stored JPEG keeps full resolution; only this comparison copy
+            # lets libjpeg decode at 1/2, 1/4 or 1/8 scale
+            image.draft('RGB', DRAFT_SIZE)
+            return self._image_tensors(image)
+    
+    def _image_tensors(self, image: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Resize an image and return the tensors used for comparison.
+        
+        Returns:
+            Tuple of ((200, 200, 3) int16 pixels, (3, 256) int32 R/G/B
+            histogram counts)
         """
-        Compare two images and return similarity score (0-100).
-        Higher score means more similar.
+        resized = image.resize(COMPARE_SIZE)
+        if resized.mode != 'RGB':
+            resized = resized.convert('RGB')
+        
+        # int16 so pixel subtraction cannot wrap around
+        pixels = np.asarray(resized, dtype=np.int16)
+        
+        # histogram() returns R, G and B bins back to back (3 x 256)
+        hist = np.array(resized.histogram(), dtype=np.int32).reshape(3, 256)
+        
+        return pixels, hist
+    
+    def _score_enrolled(self, pixels: np.ndarray, hist: np.ndarray) -> np.ndarray:
+        """
+        Compare an image's tensors against every enrolled image at once.
         
         Uses multiple comparison methods for better accuracy:
         1. Histogram comparison (color distribution)
         2. Pixel-level comparison (structural similarity)
+        
+        Returns:
+            (N,) similarity scores (0-100) in _enrolled_ids order.
+            Higher score means more similar.
         """
-        try:
-            # Resize both images to same size for comparison
-            size = (200, 200)
-            img1_resized = image1.resize(size)
-            img2_resized = image2.resize(size)
-            
-            # Convert to RGB
-            if img1_resized.mode != 'RGB':
-                img1_resized = img1_resized.convert('RGB')
-            if img2_resized.mode != 'RGB':
-                img2_resized = img2_resized.convert('RGB')
-            
-            # Method 1: Histogram comparison for color distribution (40% weight)
-            hist1_r = img1_resized.histogram()[0:256]
-            hist1_g = img1_resized.histogram()[256:512]
-            hist1_b = img1_resized.histogram()[512:768]
-            
-            hist2_r = img2_resized.histogram()[0:256]
-            hist2_g = img2_resized.histogram()[256:512]
-            hist2_b = img2_resized.histogram()[512:768]
-            
-            def correlate(hist1, hist2):
-                sum1 = sum(hist1)
-                sum2 = sum(hist2)
-                if sum1 == 0 or sum2 == 0:
-                    return 0
-                
-                # Normalize histograms
-                hist1_norm = [h / sum1 for h in hist1]
-                hist2_norm = [h / sum2 for h in hist2]
-                
-                # Calculate correlation
-                correlation = sum(h1 * h2 for h1, h2 in zip(hist1_norm, hist2_norm))
-                return correlation
-            
-            corr_r = correlate(hist1_r, hist2_r)
-            corr_g = correlate(hist1_g, hist2_g)
-            corr_b = correlate(hist1_b, hist2_b)
-            
-            histogram_similarity = (corr_r + corr_g + corr_b) / 3.0
-            
-            # Method 2: Pixel-level comparison (60% weight)
-            # Convert images to pixel arrays
-            pixels1 = list(img1_resized.getdata())
-            pixels2 = list(img2_resized.getdata())
-            
-            if len(pixels1) != len(pixels2):
-                return 0.0
-            
-            # Calculate pixel differences
-            total_pixels = len(pixels1)
-            pixel_differences = 0
-            
-            for p1, p2 in zip(pixels1, pixels2):
-                # Calculate Euclidean distance between RGB values
-                r_diff = abs(p1[0] - p2[0])
-                g_diff = abs(p1[1] - p2[1])
-                b_diff = abs(p1[2] - p2[2])
-                
-                # Average difference for this pixel (0-255 scale)
-                avg_diff = (r_diff + g_diff + b_diff) / 3.0
-                pixel_differences += avg_diff
-            
-            # Average difference per pixel
-            avg_pixel_diff = pixel_differences / total_pixels
-            
-            # Convert to similarity (0-1 scale)
-            # If avg difference is 0, similarity is 1; if avg difference is 255, similarity is 0
-            pixel_similarity = 1.0 - (avg_pixel_diff / 255.0)
-            
-            # Combine both methods with weights
-            combined_similarity = (histogram_similarity * 0.4) + (pixel_similarity * 0.6)
-            
-            # Convert to 0-100 scale
-            similarity = combined_similarity * 100
-            
-            return similarity
-            
-        except Exception as e:
-            print(f"Error comparing images: {e}")
-            return 0.0
+        if _score_kernel is not None:
+            # Fused single pass over each enrolled row, split across cores
+            n_users = len(self._enrolled_ids)
+            similarities = np.empty(n_users)
+            _score_kernel(
+                self._enrolled_pixels.reshape(n_users, pixels.size),
+                self._enrolled_hists.reshape(n_users, hist.size),
+                pixels.reshape(-1), hist.reshape(-1), similarities
+            )
+            return similarities
+        
+        # Method 1: Histogram comparison for color distribution (40% weight)
+        # Per-channel correlation of the normalized histograms, averaged. The
+        # dot product runs on the integer counts; every channel of a 200x200
+        # image sums to the same pixel count, so normalizing is one division.
+        channel_pixels = pixels.shape[0] * pixels.shape[1]
+        correlation = np.einsum('nij,ij->ni', self._enrolled_hists, hist, dtype=np.int64)
+        histogram_similarity = correlation.mean(axis=1) / (channel_pixels * channel_pixels)
+        
+        # Method 2: Pixel-level comparison (60% weight)
+        # Average absolute RGB difference per pixel (0-255 scale)
+        avg_pixel_diff = np.abs(self._enrolled_pixels - pixels[None]).mean(axis=(1, 2, 3))
+        
+        # Convert to similarity (0-1 scale)
+        # If avg difference is 0, similarity is 1; if avg difference is 255, similarity is 0
+        pixel_similarity = 1.0 - (avg_pixel_diff / 255.0)
+        
+        # Combine both methods with weights and convert to 0-100 scale
+        return ((histogram_similarity * 0.4) + (pixel_similarity * 0.6)) * 100
     
     def verify_face(self, base64_image: str) -> Tuple[bool, Optional[str], Optional[str]]:
         """
         Verify face against enrolled users.
         
+        Args:
+            base64_image: Base64 encoded image string
+            
+        Returns:
+            Tuple of (success: bool, message: Optional[str], user_id: Optional[str])
+        """
+        try:
+            image_data = base64.b64decode(base64_image)
+        except Exception as e:
+            print(f"ERROR in face verification: {e}")
+            return False, f"Error processing image: {str(e)}", None
+        return self.verify_face_bytes(image_data)
+    
+    def verify_face_bytes(self, image_data: bytes) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        Verify face against enrolled users from raw image file bytes.
+        
         In DEMO MODE:
         - Performs basic image comparison (histogram-based)
         - Requires minimum similarity threshold (40%)
         - Returns best matching user
         
         Args:
-            base64_image: Base64 encoded image string
+            image_data: Encoded image file contents (JPEG/PNG)
             
         Returns:
             Tuple of (success: bool, message: Optional[str], user_id: Optional[str])
@@ -292,21 +388,16 @@ class SimpleFaceAuthenticator:
             if not self.enrolled_users:
                 return False, "No users enrolled. Please enroll first.", None
             
-            # Decode base64 image
-            image_data = base64.b64decode(base64_image)
             captured_image = Image.open(BytesIO(image_data))
             
             # Validate image
             if captured_image.size[0] < 100 or captured_image.size[1] < 100:
                 return False, "Image too small. Please ensure face is clearly visible.", None
             
-            # Convert to RGB if needed
-            if captured_image.mode != 'RGB':
-                captured_image = captured_image.convert('RGB')
-            
             # In demo mode, perform basic image comparison
             if DEMO_MODE:
                 # Simple validation: image should have reasonable dimensions
+                # (header size, checked before the reduced-scale decode)
                 width, height = captured_image.size
                 
                 if width < 200 or height < 200:
@@ -315,40 +406,39 @@ class SimpleFaceAuthenticator:
                 if width > 4000 or height > 4000:
                     return False, "Image resolution too high. This seems unusual.", None
                 
-                # Check if image has reasonable data (not completely black/white)
-                pixels = list(captured_image.getdata())
-                if not pixels:
-                    return False, "Empty image data", None
+                # Decode JPEGs at reduced scale, then convert to RGB if needed
+                captured_image.draft('RGB', DRAFT_SIZE)
+                if captured_image.mode != 'RGB':
+                    captured_image = captured_image.convert('RGB')
                 
-                unique_colors = len(set(pixels[:100]))
-                if unique_colors < 5:
+                # Check if image has reasonable data (not completely black/white)
+                # getextrema() gives the (min, max) of each band without copying pixels
+                contrast = max(high - low for low, high in captured_image.getextrema())
+                if contrast < 10:
                     return False, "Image appears to be blank or has no face visible", None
                 
                 # Compare against all enrolled users
                 best_match_user_id = None
                 best_similarity = 0.0
                 
-                print("\n--- Face Comparison Results ---")
-                for user_id, user_data in self.enrolled_users.items():
-                    # Load enrolled user's image
-                    enrolled_image_path = self.enrolled_users_dir / user_data["image_file"]
-                    
-                    if not enrolled_image_path.exists():
-                        print(f"⚠️  Enrolled image not found for {user_id}")
-                        continue
-                    
-                    enrolled_image = Image.open(enrolled_image_path)
-                    
-                    # Compare images
-                    similarity = self._compare_images(captured_image, enrolled_image)
-                    print(f"   {user_data['name']} ({user_id}): {similarity:.2f}% match")
-                    
-                    if similarity > best_similarity:
-                        best_similarity = similarity
-                        best_match_user_id = user_id
+                # The captured image is resized and histogrammed once
+                captured_pixels, captured_hist = self._image_tensors(captured_image)
+                
+                similarities = self._score_enrolled(captured_pixels, captured_hist)
+                
+                if FACE_DEBUG:
+                    print("\n--- Face Comparison Results ---")
+                    for user_id, similarity in zip(self._enrolled_ids, similarities.tolist()):
+                        print(f"   {self.enrolled_users[user_id]['name']} ({user_id}): {similarity:.2f}% match")
+                    print("-------------------------------\n")
                 
-                print(f"   Best match: {best_similarity:.2f}%")
-                print("-------------------------------\n")
+                if len(similarities):
+                    best = int(similarities.argmax())
+                    best_similarity = float(similarities[best])
+                    best_match_user_id = self._enrolled_ids[best]
+                
+                print(f"🎯 Face verification: best match {best_match_user_id} "
+                      f"{best_similarity:.2f}%, {len(similarities)} compared")
                 
                 # Lowered threshold to 48% for better usability (was 55%)
                 SIMILARITY_THRESHOLD = 48.0
@@ -453,8 +543,26 @@ def create_auth_router() -> APIRouter:
             FaceLoginResponse with success status and user info
         """
         # Verify the face
-        success, message, user_id = face_authenticator.verify_face(request.image)
+        return _login_response(*face_authenticator.verify_face(request.image))
+    
+    @router.post("/face-login/upload", response_model=FaceLoginResponse)
+    async def face_login_upload(image: UploadFile = File(...)) -> FaceLoginResponse:
+        """
+        Authenticate user via face recognition from a multipart image upload.
         
+        Same as /face-login but skips the base64 encoding of the image.
+        
+        Args:
+            image: Uploaded image file
+            
+        Returns:
+            FaceLoginResponse with success status and user info
+        """
+        image_bytes = await image.read()
+        return _login_response(*face_authenticator.verify_face_bytes(image_bytes))
+    
+    def _login_response(success, message, user_id) -> FaceLoginResponse:
+        """Build the face login response from a verification result."""
         if success:
             user_name = face_authenticator.enrolled_users[user_id]["name"] if user_id else "Unknown"
             return FaceLoginResponse(
@@ -12,6 +12,15 @@ class Settings(BaseSettings):
     port: int = 8000
     reload: bool = True
     
+    # Print every relayed WebSocket message (off by default - the robot
+    # streams vision frames at ~10 fps)
+    ws_debug: bool = False
+    
+    # Seconds between application-level keep_alive messages on each WebSocket.
+    # 0 disables them: uvicorn already sends protocol PINGs (ws_ping_interval).
+    # Enable only behind proxies that drop idle connections despite PINGs.
+    app_heartbeat_interval: float = 0
+    
     # Application settings
     title: str = "MediRunner WebSocket Gateway"
     description: str = "WebSocket gateway for MediRunner robot communication"
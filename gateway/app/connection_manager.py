@@ -1,10 +1,16 @@
 """
 WebSocket connection manager for handling robot and console connections.
 """
+import asyncio
 from typing import Dict, List
 from fastapi import WebSocket
 
-from .models import MessageEnvelope
+from .config import settings
+from .models import MessageEnvelope, envelope_template, stamp_envelope
+
+# Lossy message types: a console that cannot keep up only ever gets the
+# newest one instead of stalling the robot's receive loop
+LATEST_ONLY_TYPES = frozenset({"vision_frame"})
 
 
 class ConnectionManager:
@@ -15,6 +21,10 @@ class ConnectionManager:
         self.robot_sockets: Dict[str, WebSocket] = {}
         # Zero or more consoles per robotId
         self.console_sockets: Dict[str, List[WebSocket]] = {}
+        # Per-console single-slot queue of the newest vision frame, drained by
+        # a writer task (see LATEST_ONLY_TYPES)
+        self._frame_slots: Dict[WebSocket, asyncio.Queue] = {}
+        self._frame_writers: Dict[WebSocket, asyncio.Task] = {}
 
     async def connect_robot(self, robot_id: str, websocket: WebSocket):
         """Connect a robot WebSocket."""
@@ -30,6 +40,11 @@ class ConnectionManager:
         """Connect a console WebSocket."""
         await websocket.accept()
         self.console_sockets.setdefault(robot_id, []).append(websocket)
+        slot = asyncio.Queue(maxsize=1)
+        self._frame_slots[websocket] = slot
+        self._frame_writers[websocket] = asyncio.create_task(
+            self._write_frames(robot_id, websocket, slot)
+        )
         print(f"[CONSOLE] Connected for robot: {robot_id}")
 
     async def disconnect_robot(self, robot_id: str):
@@ -42,17 +57,39 @@ class ConnectionManager:
 
     def disconnect_console(self, robot_id: str, websocket: WebSocket):
         """Disconnect a console WebSocket."""
-        if robot_id in self.console_sockets:
-            self.console_sockets[robot_id] = [
-                ws for ws in self.console_sockets[robot_id] if ws is not websocket
-            ]
+        sockets = self.console_sockets.get(robot_id)
+        if sockets is not None:
+            # WebSocket has no __eq__, so remove() matches by identity
+            try:
+                sockets.remove(websocket)
+            except ValueError:
+                pass
             print(f"[CONSOLE] Disconnected for robot: {robot_id}")
+        self._frame_slots.pop(websocket, None)
+        writer = self._frame_writers.pop(websocket, None)
+        if writer is not None:
+            writer.cancel()
+
+    async def _write_frames(self, robot_id: str, websocket: WebSocket, slot: asyncio.Queue):
+        """Send a console the frames queued in its slot until the send fails."""
+        while True:
+            data = await slot.get()
+            try:
+                await websocket.send_text(data)
+            except Exception as e:
+                print(f"[WARN] Dropping dead console for {robot_id}: {e}")
+                self.disconnect_console(robot_id, websocket)
+                return
 
     async def send_to_robot(self, robot_id: str, message: MessageEnvelope):
         """Send a message to a specific robot."""
+        await self.send_raw_to_robot(robot_id, message.type, message.model_dump_json())
+
+    async def send_raw_to_robot(self, robot_id: str, message_type: str, data: str):
+        """Send an already serialized message envelope to a specific robot."""
         ws = self.robot_sockets.get(robot_id)
         if ws is None:
-            print(f"[WARN] No robot connected for {robot_id}, cannot send {message.type}")
+            print(f"[WARN] No robot connected for {robot_id}, cannot send {message_type}")
             await self.broadcast_to_consoles(
                 robot_id,
                 MessageEnvelope(
@@ -63,20 +100,70 @@ class ConnectionManager:
             )
             return
 
-        await ws.send_text(message.model_dump_json())
-        print(f"[-> ROBOT {robot_id}] {message.type}")
+        await ws.send_text(data)
+        if settings.ws_debug:
+            print(f"[-> ROBOT {robot_id}] {message_type}")
 
     async def broadcast_to_consoles(self, robot_id: str, message: MessageEnvelope):
         """Broadcast a message to all consoles connected to a specific robot."""
+        if not self.console_sockets.get(robot_id):
+            print(f"[WARN] No consoles connected for {robot_id}, dropping {message.type}")
+            return
+        await self.broadcast_raw_to_consoles(robot_id, message.type, message.model_dump_json())
+
+    async def broadcast_raw_to_consoles(self, robot_id: str, message_type: str, data: str):
+        """
+        Broadcast an already serialized message envelope to all consoles
+        connected to a specific robot.
+
+        Used to relay robot frames verbatim, so large vision payloads are
+        never re-serialized.
+        """
         sockets = self.console_sockets.get(robot_id, [])
         if not sockets:
-            print(f"[WARN] No consoles connected for {robot_id}, dropping {message.type}")
+            # Robots stream whether or not anyone is watching, so this is per frame
+            if settings.ws_debug:
+                print(f"[WARN] No consoles connected for {robot_id}, dropping {message_type}")
+            return
+
+        if message_type in LATEST_ONLY_TYPES:
+            # Hand the frame to each console's writer, replacing any frame it
+            # has not sent yet; never waits on a slow console
+            for ws in sockets:
+                slot = self._frame_slots.get(ws)
+                if slot is None:
+                    continue
+                if slot.full():
+                    slot.get_nowait()
+                slot.put_nowait(data)
+            if settings.ws_debug:
+                print(f"[ROBOT {robot_id} -> {len(sockets)} CONSOLE(S)] {message_type} (queued)")
             return
 
-        data = message.model_dump_json()
-        for ws in sockets:
-            await ws.send_text(data)
-        print(f"[ROBOT {robot_id} -> {len(sockets)} CONSOLE(S)] {message.type}")
+        # Send to all consoles concurrently; one dead socket must not stall
+        # or fail the others. Snapshot the list - consoles may (dis)connect
+        # while the sends are in flight.
+        targets = tuple(sockets)
+        results = await asyncio.gather(
+            *(ws.send_text(data) for ws in targets), return_exceptions=True
+        )
+        delivered = len(targets)
+        for ws, result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"[WARN] Dropping dead console for {robot_id}: {result}")
+                self.disconnect_console(robot_id, ws)
+                delivered -= 1
+        if settings.ws_debug:
+            print(f"[ROBOT {robot_id} -> {delivered} CONSOLE(S)] {message_type}")
+
+    async def send_robot_status(self, robot_id: str, websocket: WebSocket) -> bool:
+        """Send a robot's current online status to one console; returns isOnline."""
+        is_online = robot_id in self.robot_sockets
+        template = envelope_template(
+            "robot_status", robot_id, {"isOnline": is_online, "source": "console_connect"}
+        )
+        await websocket.send_text(stamp_envelope(template))
+        return is_online
 
     async def send_handshake_ping(self, robot_id: str):
         """Send a ping to robot to check liveness when console connects."""
@@ -98,17 +185,12 @@ class ConnectionManager:
         """Get status of all connections."""
         return {
             robot_id: self.get_robot_status(robot_id)
-            for robot_id in set(list(self.robot_sockets.keys()) + list(self.console_sockets.keys()))
+            for robot_id in self.robot_sockets.keys() | self.console_sockets.keys()
         }
     
     async def notify_robot_status(self, robot_id: str, is_online: bool):
         """Notify all consoles about robot status change."""
-        status_msg = MessageEnvelope(
-            type="robot_status",
-            robotId=robot_id,
-            payload={
-                "isOnline": is_online,
-                "source": "robot_connection_change"
-            }
+        template = envelope_template(
+            "robot_status", robot_id, {"isOnline": is_online, "source": "robot_connection_change"}
         )
-        await self.broadcast_to_consoles(robot_id, status_msg)
\ No newline at end of file
+        await self.broadcast_raw_to_consoles(robot_id, "robot_status", stamp_envelope(template))
@@ -10,7 +10,7 @@ from .api import create_api_router
 from .websockets import create_websocket_router
 
 # Use simplified auth for demo (works on ANY Python version)
-# Only requires Pillow - already installed and working
+# Only requires Pillow + NumPy
 # Other options: .auth_opencv (requires opencv), .auth_production (requires Python 3.12 + dlib)
 from .auth_simple import create_auth_router
 
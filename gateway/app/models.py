@@ -1,6 +1,7 @@
 """
 Data models for MediRunner WebSocket Gateway.
 """
+import json
 import time
 from typing import Optional, Dict, Any
 
@@ -12,4 +13,22 @@ class MessageEnvelope(BaseModel):
     type: str
     robotId: str
     payload: Optional[Dict[str, Any]] = None
-    timestamp: int = Field(default_factory=lambda: int(time.time() * 1000))
\ No newline at end of file
+    timestamp: int = Field(default_factory=lambda: time.time_ns() // 1_000_000)
+
+
+def envelope_template(msg_type: str, robot_id: str, payload: dict) -> str:
+    """
+    Serialize a gateway-originated envelope up to its timestamp.
+
+    Pass the result to stamp_envelope() to get the frame. Only the timestamp
+    changes between sends, so the rest can be serialized once and reused.
+    """
+    head = json.dumps(
+        {"type": msg_type, "robotId": robot_id, "payload": payload}, separators=(",", ":")
+    )
+    return head[:-1] + ',"timestamp":'
+
+
+def stamp_envelope(template: str) -> str:
+    """Complete an envelope_template() with the current time in ms."""
+    return f"{template}{time.time_ns() // 1_000_000}}}"
@@ -2,15 +2,92 @@
 WebSocket endpoints for robot and console connections.
 """
 import asyncio
+import json
 import time
 from fastapi import WebSocket, WebSocketDisconnect, Query, APIRouter
 
-from .models import MessageEnvelope
+from .config import settings
+from .models import MessageEnvelope, envelope_template, stamp_envelope
 from .connection_manager import ConnectionManager
 
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib json module
+    orjson = None
+
+# Inbound frames are parsed to a plain dict and, when already complete
+# envelopes, relayed as the original text without rebuilding a MessageEnvelope
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Robot message types relayed to the robot's consoles
+ROBOT_FORWARD_TYPES = frozenset({
+    "pong", "telemetry", "event", "vision", "mission_update", "vision_frame", "panoramic_image"
+})
+# Console message types relayed to the robot
+CONSOLE_FORWARD_TYPES = frozenset({"ping", "command", "mission"})
+
+# Seconds without any inbound message before the peer is pinged
+# (generous for the robot - panoramic images can take a while to upload)
+ROBOT_IDLE_TIMEOUT = 240.0
+CONSOLE_IDLE_TIMEOUT = 300.0
+
 router = APIRouter()
 
 
+def _parse_message(raw: str) -> dict:
+    """Parse an inbound frame and check it looks like a message envelope."""
+    data = _json_loads(raw)
+    if not isinstance(data, dict) or not isinstance(data.get("type"), str) \
+            or not isinstance(data.get("robotId"), str):
+        raise ValueError("message must be a JSON object with string 'type' and 'robotId'")
+    return data
+
+
+def _relay_text(data: dict, raw: str) -> str:
+    """
+    Return the text to forward for a parsed inbound message.
+
+    Complete envelopes are relayed verbatim; anything else (e.g. no
+    timestamp) goes through MessageEnvelope to be validated and filled in.
+    """
+    payload = data.get("payload")
+    if type(data.get("timestamp")) is int and (payload is None or isinstance(payload, dict)):
+        return raw
+    return MessageEnvelope.model_validate(data).model_dump_json()
+
+
+async def _idle_watchdog(websocket: WebSocket, idle_timeout: float, ping_frame: str, icon: str, name: str):
+    """
+    Ping the peer whenever nothing has been received for idle_timeout seconds,
+    and close the socket if the ping cannot be sent.
+
+    The receive loop records websocket.state.last_recv; one watchdog per
+    connection replaces a wait_for() timer armed around every receive.
+    """
+    loop = asyncio.get_running_loop()
+    checked_at = loop.time()
+    while True:
+        deadline = max(websocket.state.last_recv, checked_at) + idle_timeout
+        if loop.time() < deadline:
+            await asyncio.sleep(deadline - loop.time())
+            continue
+
+        checked_at = loop.time()
+        print(f"{icon} [TIMEOUT] {name} - no message for {idle_timeout:.0f}s, checking connection...")
+        try:
+            # Send a simple ping message to check if connection is alive
+            await websocket.send_text(stamp_envelope(ping_frame))
+            print(f"{icon} [PING] {name} still alive")
+        except Exception:
+            print(f"{icon} [DEAD] {name} connection dead")
+            try:
+                # Ends the pending receive with WebSocketDisconnect
+                await websocket.close()
+            except Exception:
+                pass
+            return
+
+
 def create_websocket_router(manager: ConnectionManager) -> APIRouter:
     """Create WebSocket router with connection manager dependency."""
     
@@ -21,74 +98,73 @@ def create_websocket_router(manager: ConnectionManager) -> APIRouter:
         await manager.connect_robot(robotId, websocket)
         print(f"🤖 [DEBUG] Robot {robotId} connected successfully")
 
-        # Create keep-alive task to prevent timeouts during debugging
+        # Gateway-originated frames, serialized once for this connection
+        keep_alive_frame = envelope_template("keep_alive", robotId, {"source": "gateway"})
+        ping_frame = envelope_template("ping", robotId, {"source": "timeout_check"})
+
+        # Optional application-level heartbeat (protocol PINGs are sent by uvicorn)
         async def keep_alive():
             while True:
                 try:
-                    await asyncio.sleep(30)  # Keep alive every 30 seconds
+                    await asyncio.sleep(settings.app_heartbeat_interval)
                     # Send a simple keep-alive message instead of ping
-                    keep_alive_msg = MessageEnvelope(
-                        type="keep_alive",
-                        robotId=robotId,
-                        payload={"source": "gateway"}
-                    )
-                    await websocket.send_text(keep_alive_msg.model_dump_json())
-                    print(f"🤖 [KEEPALIVE] Sent keep-alive to robot {robotId}")
+                    await websocket.send_text(stamp_envelope(keep_alive_frame))
+                    if settings.ws_debug:
+                        print(f"🤖 [KEEPALIVE] Sent keep-alive to robot {robotId}")
                 except Exception as e:
                     print(f"🤖 [KEEPALIVE] Failed for robot {robotId}: {e}")
                     break
 
-        keep_alive_task = asyncio.create_task(keep_alive())
+        keep_alive_task = (
+            asyncio.create_task(keep_alive()) if settings.app_heartbeat_interval > 0 else None
+        )
+
+        # Ping the peer if it goes quiet for too long
+        loop = asyncio.get_running_loop()
+        websocket.state.last_recv = loop.time()
+        watchdog_task = asyncio.create_task(
+            _idle_watchdog(websocket, ROBOT_IDLE_TIMEOUT, ping_frame, "🤖", f"Robot {robotId}")
+        )
 
         try:
             while True:
+                raw = await websocket.receive_text()
+                websocket.state.last_recv = loop.time()
+
+                # Log message size for debugging large messages
+                msg_size_kb = len(raw) / 1024
+                if msg_size_kb > 100:
+                    print(f"🤖 [LARGE MSG] Robot {robotId}: {msg_size_kb:.1f} KB")
+                elif settings.ws_debug:
+                    print(f"🤖 [MSG] Robot {robotId}: {raw[:100]}{'...' if len(raw) > 100 else ''}")
+
                 try:
-                    # Increased timeout for large messages like panoramic images (240 seconds)
-                    raw = await asyncio.wait_for(websocket.receive_text(), timeout=240.0)
-                    
-                    # Log message size for debugging large messages
-                    msg_size_kb = len(raw) / 1024
-                    if msg_size_kb > 100:
-                        print(f"🤖 [LARGE MSG] Robot {robotId}: {msg_size_kb:.1f} KB")
-                    else:
-                        print(f"🤖 [MSG] Robot {robotId}: {raw[:100]}{'...' if len(raw) > 100 else ''}")
-                    
+                    data = _parse_message(raw)
+                except Exception as e:
+                    print(f"🤖 [ERROR] Robot {robotId} invalid message: {e}")
+                    continue
+                msg_type = data["type"]
+
+                if msg_type in ROBOT_FORWARD_TYPES:
                     try:
-                        msg = MessageEnvelope.model_validate_json(raw)
+                        relay = _relay_text(data, raw)
                     except Exception as e:
                         print(f"🤖 [ERROR] Robot {robotId} invalid message: {e}")
                         continue
+                    if settings.ws_debug:
+                        if msg_type == "pong":
+                            print(f"🤖 [PONG] Robot {robotId} -> consoles")
+                        else:
+                            print(f"🤖 [DATA] Robot {robotId} {msg_type}")
+                    await manager.broadcast_raw_to_consoles(robotId, msg_type, relay)
 
-                    if msg.type == "pong":
-                        print(f"🤖 [PONG] Robot {robotId} -> consoles")
-                        await manager.broadcast_to_consoles(robotId, msg)
-
-                    elif msg.type in ("telemetry", "event", "vision", "mission_update", "vision_frame", "panoramic_image"):
-                        print(f"🤖 [DATA] Robot {robotId} {msg.type}")
-                        await manager.broadcast_to_consoles(robotId, msg)
-
-                    elif msg.type == "keep_alive":
+                elif msg_type == "keep_alive":
+                    if settings.ws_debug:
                         print(f"🤖 [KEEPALIVE] Robot {robotId} acknowledged keep-alive")
-                        # Keep-alive messages are just for connection health, no forwarding needed
+                    # Keep-alive messages are just for connection health, no forwarding needed
 
-                    else:
-                        print(f"🤖 [UNKNOWN] Robot {robotId} type: {msg.type}")
-
-                except asyncio.TimeoutError:
-                    print(f"🤖 [TIMEOUT] Robot {robotId} - no message for 240s, checking connection...")
-                    try:
-                        # Send a simple ping message to check if connection is alive
-                        ping_msg = MessageEnvelope(
-                            type="ping",
-                            robotId=robotId,
-                            payload={"source": "timeout_check"}
-                        )
-                        await websocket.send_text(ping_msg.model_dump_json())
-                        print(f"🤖 [PING] Robot {robotId} still alive")
-                        continue  # Connection is alive, keep waiting
-                    except Exception:
-                        print(f"🤖 [DEAD] Robot {robotId} connection dead")
-                        break
+                else:
+                    print(f"🤖 [UNKNOWN] Robot {robotId} type: {msg_type}")
 
         except WebSocketDisconnect as e:
             print(f"🤖 [DISCONNECT] Robot {robotId} - code: {e.code}")
@@ -97,7 +173,9 @@ def create_websocket_router(manager: ConnectionManager) -> APIRouter:
             print(f"🤖 [ERROR] Robot {robotId} WebSocket error: {type(e).__name__}: {e}")
             await manager.disconnect_robot(robotId)
         finally:
-            keep_alive_task.cancel()
+            watchdog_task.cancel()
+            if keep_alive_task is not None:
+                keep_alive_task.cancel()
 
     @router.websocket("/console")
     async def console_ws(websocket: WebSocket, robotId: str = Query(...)):
@@ -111,38 +189,38 @@ def create_websocket_router(manager: ConnectionManager) -> APIRouter:
         await manager.connect_console(robotId, websocket)
         print(f"🖥️ [DEBUG] Console {robotId} connected")
 
-        # Create keep-alive task for console to prevent timeouts during debugging
+        # Gateway-originated frames, serialized once for this connection
+        keep_alive_frame = envelope_template("keep_alive", robotId, {"source": "gateway"})
+        ping_frame = envelope_template("ping", robotId, {"source": "timeout_check"})
+
+        # Optional application-level heartbeat (protocol PINGs are sent by uvicorn)
         async def keep_alive():
             while True:
                 try:
-                    await asyncio.sleep(30)  # Keep alive every 30 seconds
+                    await asyncio.sleep(settings.app_heartbeat_interval)
                     # Send a simple keep-alive message instead of ping
-                    keep_alive_msg = MessageEnvelope(
-                        type="keep_alive",
-                        robotId=robotId,
-                        payload={"source": "gateway"}
-                    )
-                    await websocket.send_text(keep_alive_msg.model_dump_json())
-                    print(f"🖥️ [KEEPALIVE] Sent keep-alive to console {robotId}")
+                    await websocket.send_text(stamp_envelope(keep_alive_frame))
+                    if settings.ws_debug:
+                        print(f"🖥️ [KEEPALIVE] Sent keep-alive to console {robotId}")
                 except Exception as e:
                     print(f"🖥️ [KEEPALIVE] Failed for console {robotId}: {e}")
                     break
 
-        keep_alive_task = asyncio.create_task(keep_alive())
+        keep_alive_task = (
+            asyncio.create_task(keep_alive()) if settings.app_heartbeat_interval > 0 else None
+        )
+
+        # Ping the peer if it goes quiet for too long
+        loop = asyncio.get_running_loop()
+        websocket.state.last_recv = loop.time()
+        watchdog_task = asyncio.create_task(
+            _idle_watchdog(websocket, CONSOLE_IDLE_TIMEOUT, ping_frame, "🖥️", f"Console {robotId}")
+        )
 
         # 🔹 Send robot status immediately when console connects
         try:
-            robot_status = manager.get_robot_status(robotId)
-            status_msg = MessageEnvelope(
-                type="robot_status",
-                robotId=robotId,
-                payload={
-                    "isOnline": robot_status["robot_connected"],
-                    "source": "console_connect"
-                }
-            )
-            await websocket.send_text(status_msg.model_dump_json())
-            print(f"🖥️ [STATUS] Sent robot status to console: {robotId} online={robot_status['robot_connected']}")
+            is_online = await manager.send_robot_status(robotId, websocket)
+            print(f"🖥️ [STATUS] Sent robot status to console: {robotId} online={is_online}")
         except Exception as e:
             print(f"🖥️ [STATUS] Failed to send status for {robotId}: {e}")
 
@@ -155,42 +233,33 @@ def create_websocket_router(manager: ConnectionManager) -> APIRouter:
 
         try:
             while True:
-                try:
-                    # Longer timeout for console during debugging (5 minutes)
-                    raw = await asyncio.wait_for(websocket.receive_text(), timeout=300.0)
+                raw = await websocket.receive_text()
+                websocket.state.last_recv = loop.time()
+                if settings.ws_debug:
                     print(f"🖥️ [MSG] Console {robotId}: {raw[:100]}{'...' if len(raw) > 100 else ''}")
-                    
+
+                try:
+                    data = _parse_message(raw)
+                except Exception as e:
+                    print(f"🖥️ [ERROR] Console {robotId} invalid message: {e}")
+                    continue
+                msg_type = data["type"]
+
+                # Console-originated messages that should go to robot:
+                if msg_type in CONSOLE_FORWARD_TYPES:
                     try:
-                        msg = MessageEnvelope.model_validate_json(raw)
+                        relay = _relay_text(data, raw)
                     except Exception as e:
                         print(f"🖥️ [ERROR] Console {robotId} invalid message: {e}")
                         continue
-
-                    # Console-originated messages that should go to robot:
-                    if msg.type in ("ping", "command", "mission"):
-                        print(f"🖥️ [SEND] Console {robotId} -> robot: {msg.type}")
-                        await manager.send_to_robot(robotId, msg)
-                    elif msg.type == "keep_alive":
+                    print(f"🖥️ [SEND] Console {robotId} -> robot: {msg_type}")
+                    await manager.send_raw_to_robot(robotId, msg_type, relay)
+                elif msg_type == "keep_alive":
+                    if settings.ws_debug:
                         print(f"🖥️ [KEEPALIVE] Console {robotId} acknowledged keep-alive")
-                        # Keep-alive messages are just for connection health, no forwarding needed
-                    else:
-                        print(f"🖥️ [UNKNOWN] Console {robotId} type: {msg.type}")
-
-                except asyncio.TimeoutError:
-                    print(f"🖥️ [TIMEOUT] Console {robotId} - no message for 300s, checking connection...")
-                    try:
-                        # Send a simple ping message to check if connection is alive
-                        ping_msg = MessageEnvelope(
-                            type="ping",
-                            robotId=robotId,
-                            payload={"source": "timeout_check"}
-                        )
-                        await websocket.send_text(ping_msg.model_dump_json())
-                        print(f"🖥️ [PING] Console {robotId} still alive")
-                        continue  # Connection is alive, keep waiting
-                    except Exception:
-                        print(f"🖥️ [DEAD] Console {robotId} connection dead")
-                        break
+                    # Keep-alive messages are just for connection health, no forwarding needed
+                else:
+                    print(f"🖥️ [UNKNOWN] Console {robotId} type: {msg_type}")
 
         except WebSocketDisconnect as e:
             print(f"🖥️ [DISCONNECT] Console {robotId} - code: {e.code}")
@@ -199,6 +268,8 @@ def create_websocket_router(manager: ConnectionManager) -> APIRouter:
             print(f"🖥️ [ERROR] Console {robotId} WebSocket error: {type(e).__name__}: {e}")
             manager.disconnect_console(robotId, websocket)
         finally:
-            keep_alive_task.cancel()
+            watchdog_task.cancel()
+            if keep_alive_task is not None:
+                keep_alive_task.cancel()
 
     return router
\ No newline at end of file
@@ -112,6 +112,15 @@ class RobotClient:
                 print(f"Error sending telemetry: {e}")
                 break
 
+    def sleep_until(self, deadline):
+        """Sleep until a time.monotonic() deadline; returns the new schedule base"""
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            return deadline
+        # Running behind - restart the schedule rather than bursting frames
+        return time.monotonic()
+
     def open_video_capture(self):
         """Open video capture from mock video file"""
         return cv2.VideoCapture("./assets/mock_camera_video.mp4")
@@ -128,6 +137,10 @@ class RobotClient:
                 
             print("Started mock camera stream")
             
+            # Frames are paced against a monotonic schedule, so JPEG encode and
+            # send time no longer stretch the interval below the target fps
+            frame_deadline = time.monotonic()
+            
             while self.running and self.ws:
                 try:
                     ret, frame = cap.read()
@@ -153,11 +166,11 @@ class RobotClient:
                     
                     if not success:
                         print("[WARN] Failed to JPEG-encode frame, skipping.")
-                        time.sleep(FRAME_INTERVAL_SEC)
+                        frame_deadline = self.sleep_until(frame_deadline + FRAME_INTERVAL_SEC)
                         continue
                     
                     # Convert to base64
-                    b64_frame = base64.b64encode(encoded_frame.tobytes()).decode('utf-8')
+                    b64_frame = base64.b64encode(encoded_frame).decode('ascii')
                     
                     # Build vision frame message
                     msg = {
@@ -178,13 +191,13 @@ class RobotClient:
                     self.ws.send(json.dumps(msg))
                     print(f"Sent vision frame: {FRAME_WIDTH}x{FRAME_HEIGHT}, quality={JPEG_QUALITY}")
                     
-                    # Wait before next frame
-                    time.sleep(FRAME_INTERVAL_SEC)
+                    # Wait for the next frame slot
+                    frame_deadline = self.sleep_until(frame_deadline + FRAME_INTERVAL_SEC)
                     
                 except Exception as e:
                     print(f"Error streaming video frame: {e}")
                     # Continue loop - don't break on individual frame errors
-                    time.sleep(FRAME_INTERVAL_SEC)
+                    frame_deadline = self.sleep_until(frame_deadline + FRAME_INTERVAL_SEC)
                     
         except Exception as e:
             print(f"Fatal error in video streaming: {e}")
@@ -1,63 +1,175 @@
 # mjpeg_server.py
+try:
+    # Patch before anything imports threading/socket so time.sleep in the
+    # stream generators yields to other clients instead of blocking
+    from gevent import monkey
+    monkey.patch_all()
+    from gevent.pywsgi import WSGIServer
+except ImportError:  # gevent is optional - fall back to Flask's threaded dev server
+    WSGIServer = None
+
 import cv2
+import itertools
+import os
+import threading
 import time
 from flask import Flask, Response
 
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+except ImportError:  # PyTurboJPEG is optional - fall back to cv2.imencode
+    TurboJPEG = None
+
 VIDEO_PATH = "./assets/mock_camera_video.mp4"
 FRAME_WIDTH = 320
 FRAME_HEIGHT = 240
 JPEG_QUALITY = 60
 FRAME_INTERVAL_SEC = 0.1  # 10 FPS
 
+# Resolution/quality ladder, picked per client with /stream?q=<tier>
+STREAM_TIERS = {
+    "low": (160, 120, 40),
+    "medium": (FRAME_WIDTH, FRAME_HEIGHT, JPEG_QUALITY),
+    "high": (640, 480, 75),
+}
+DEFAULT_TIER = "medium"
+
+# Tiers to pre-encode and serve, e.g. MJPEG_TIERS=medium; each one keeps the
+# whole video in memory, and requests for a disabled tier get DEFAULT_TIER
+ENABLED_TIERS = [DEFAULT_TIER] + [
+    tier for tier in (name.strip() for name in os.getenv("MJPEG_TIERS", "low,high").split(","))
+    if tier in STREAM_TIERS and tier != DEFAULT_TIER
+]
+# Cap on cached JPEG bytes across all tiers; longer videos loop early past it
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Multipart part header around each JPEG (Content-Length goes in between)
+_PART_HEADER_PREFIX = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+_PART_HEADER_SUFFIX = b"\r\n\r\n"
+
 app = Flask(__name__)
 
+# libjpeg-turbo encoder (SIMD colour conversion/DCT/Huffman), if available
+try:
+    _turbo_jpeg = TurboJPEG() if TurboJPEG is not None else None
+except OSError as e:  # Python bindings installed but libturbojpeg not found
+    print(f"[WARN] TurboJPEG unavailable, using OpenCV encoder: {e}")
+    _turbo_jpeg = None
+
 def open_video_capture():
     return cv2.VideoCapture(VIDEO_PATH)
 
-def generate_frames():
+def encode_jpeg(frame, quality=JPEG_QUALITY):
+    """JPEG-encode a BGR frame, returning the bytes (None on failure)"""
+    if _turbo_jpeg is not None:
+        return _turbo_jpeg.encode(
+            frame, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420
+        )
+
+    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    success, encoded = cv2.imencode(".jpg", frame, encode_params)
+    if not success:
+        return None
+    return encoded.tobytes()
+
+# Encoded MJPEG chunks for the whole video per tier, shared by every /stream client
+_frames = {}
+_frames_lock = threading.Lock()
+
+def encode_frame_chunk(frame, width, height, quality):
+    """Resize and JPEG-encode a frame into an MJPEG multipart chunk (None on failure)"""
+    # Resize
+    frame = cv2.resize(frame, (width, height))
+
+    # Encode JPEG
+    jpg_bytes = encode_jpeg(frame, quality)
+    if jpg_bytes is None:
+        return None
+
+    # MJPEG chunk with proper Content-Length for browser compatibility
+    return b"".join((_PART_HEADER_PREFIX, b"%d" % len(jpg_bytes), _PART_HEADER_SUFFIX, jpg_bytes, b"\r\n"))
+
+def preload_frames():
+    """
+    Decode the video once and encode every frame for every tier in ENABLED_TIERS.
+
+    The video is a fixed loop, so this runs once (at startup, or on the first
+    /stream request when imported by another WSGI host) and /stream then only
+    serves from memory.
+    """
     cap = open_video_capture()
     if not cap.isOpened():
         print("[ERROR] Failed to open video file:", VIDEO_PATH)
-        # Keep connection alive, but no frames
-        while True:
-            time.sleep(1)
-            yield b""
-    
+        return
+
     print("[INFO] Video opened successfully")
 
+    chunks = {tier: [] for tier in ENABLED_TIERS}
+    total_bytes = 0
     while True:
         ret, frame = cap.read()
-
-        # Loop video
         if not ret:
-            print("[INFO] End of video, looping back to start")
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
+            break
+
+        if total_bytes > MAX_CACHE_BYTES:
+            print(f"[WARN] Frame cache reached {MAX_CACHE_BYTES // (1024 * 1024)} MB, looping the video early")
+            break
+
+        for tier in ENABLED_TIERS:
+            width, height, quality = STREAM_TIERS[tier]
+            chunk = encode_frame_chunk(frame, width, height, quality)
+            if chunk is None:
+                print(f"[WARN] Failed to JPEG-encode {tier} frame, skipping.")
+                continue
+            chunks[tier].append(chunk)
+            total_bytes += len(chunk)
 
-        # Resize
-        frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
+    cap.release()
 
-        # Encode JPEG
-        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
-        success, encoded = cv2.imencode(".jpg", frame, encode_params)
-        if not success:
-            print("[WARN] Failed to JPEG-encode frame, skipping.")
-            time.sleep(FRAME_INTERVAL_SEC)
+    for tier, tier_chunks in chunks.items():
+        if not tier_chunks:
+            print(f"[ERROR] No {tier} frames could be encoded from video file:", VIDEO_PATH)
             continue
+        frames = _frames[tier] = tuple(tier_chunks)
+        print(f"[INFO] Cached {len(frames)} {tier} frames ({sum(map(len, frames)) // 1024} KB)")
 
-        jpg_bytes = encoded.tobytes()
+def load_frames(tier=DEFAULT_TIER):
+    """
+    Return the pre-encoded MJPEG chunks for a tier, preloading the video on
+    first use (empty if the video couldn't be read)
+    """
+    frames = _frames.get(tier)
+    if frames is not None:
+        return frames
 
-        # MJPEG chunk with proper Content-Length for browser compatibility
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n"
-            b"Content-Length: " + str(len(jpg_bytes)).encode('ascii') + b"\r\n"
-            b"\r\n" +
-            jpg_bytes +
-            b"\r\n"
-        )
+    with _frames_lock:
+        if not _frames:
+            preload_frames()
+    return _frames.get(tier, ())
+
+def sleep_until(deadline):
+    """Sleep until a time.monotonic() deadline; returns the new schedule base"""
+    delay = deadline - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+        return deadline
+    # Running behind - restart the schedule rather than bursting frames
+    return time.monotonic()
+
+def generate_frames(tier=DEFAULT_TIER):
+    frames = load_frames(tier)
+    if not frames:
+        # Keep connection alive, but no frames
+        while True:
+            time.sleep(1)
+            yield b""
 
-        time.sleep(FRAME_INTERVAL_SEC)
+    # Pace frames on a monotonic schedule so time spent in yield/send doesn't add drift
+    frame_deadline = time.monotonic()
+    for chunk in itertools.cycle(frames):
+        yield chunk
+
+        frame_deadline = sleep_until(frame_deadline + FRAME_INTERVAL_SEC)
 
 
 
@@ -82,6 +194,7 @@ def index():
         <div class="info">
             <p><strong>Network Stream URL:</strong> http://192.168.1.184:5001/stream</p>
             <p><strong>Local Stream URL:</strong> http://127.0.0.1:5001/stream</p>
+            <p><strong>Quality:</strong> /stream?q=low | medium | high</p>
             <p><strong>Test Frame:</strong> <a href="/test_frame" target="_blank">Single Frame</a></p>
         </div>
         
@@ -108,9 +221,18 @@ def index():
     </html>
     '''
 
+# JPEG served by /test_frame, cached after the first successful request
+_test_frame_jpeg = None
+
 @app.route("/test_frame")
 def test_frame():
     """Serve a single test frame to verify video encoding"""
+    global _test_frame_jpeg
+
+    # The first frame never changes - encode it once and reuse it
+    if _test_frame_jpeg is not None:
+        return Response(_test_frame_jpeg, mimetype='image/jpeg')
+    
     cap = open_video_capture()
     if not cap.isOpened():
         return "Error: Could not open video file", 500
@@ -123,13 +245,13 @@ def test_frame():
     
     # Resize and encode
     frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
-    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
-    success, encoded = cv2.imencode(".jpg", frame, encode_params)
+    jpg_bytes = encode_jpeg(frame)
     
-    if not success:
+    if jpg_bytes is None:
         return "Error: Could not encode frame", 500
     
-    return Response(encoded.tobytes(), mimetype='image/jpeg')
+    _test_frame_jpeg = jpg_bytes
+    return Response(jpg_bytes, mimetype='image/jpeg')
 
 @app.route("/stream")
 def stream():
@@ -138,11 +260,14 @@ def stream():
     # Capture request info before starting the generator
     client_ip = request.remote_addr
     user_agent = request.headers.get('User-Agent', 'Unknown')
-    print(f"[INFO] Stream accessed from {client_ip} - User-Agent: {user_agent}")
+    tier = request.args.get('q', DEFAULT_TIER)
+    if tier not in ENABLED_TIERS:
+        tier = DEFAULT_TIER
+    print(f"[INFO] Stream accessed from {client_ip} ({tier}) - User-Agent: {user_agent}")
     
     def generate_with_logging():
         frame_count = 0
-        for frame_data in generate_frames():
+        for frame_data in generate_frames(tier):
             frame_count += 1
             if frame_count % 50 == 0:  # Log every 50 frames
                 print(f"[DEBUG] Served {frame_count} frames to {client_ip}")
@@ -168,8 +293,16 @@ if __name__ == "__main__":
     print(f"[INFO] Frame rate: {1/FRAME_INTERVAL_SEC:.1f} FPS")
     print("[INFO] Press Ctrl+C to stop the server")
     
+    # Decode and encode the whole video for every enabled tier before serving anyone
+    load_frames()
+    
     try:
-        app.run(host="0.0.0.0", port=5001, threaded=True, debug=False)
+        if WSGIServer is not None:
+            # One greenlet per viewer instead of one OS thread
+            print("[INFO] Using gevent WSGI server")
+            WSGIServer(("0.0.0.0", 5001), app).serve_forever()
+        else:
+            app.run(host="0.0.0.0", port=5001, threaded=True, debug=False)
     except KeyboardInterrupt:
         print("\n[INFO] Server stopped by user")
     except Exception as e: